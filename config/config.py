@@ -23,29 +23,78 @@ SENSITIVITY = [0.5]  # 唤醒灵敏度（0.0-1.0）
 # 语音识别模型；下载中文模型：https://alphacephei.com/vosk/models
 #VOSK_MODEL = "models/vosk-model-small-cn-0.22"
 VOSK_MODEL = "models/vosk-model-cn-0.22"
+VOSK_PRELOAD = True  # 启动时在后台预加载Vosk模型
+VOSK_RECOGNIZER_POOL_SIZE = 2  # 每个采样率缓存的识别器数量
 
 # 音频配置
 AUDIO_DEVICE_INDEX = None  # 录音设备索引，None表示使用默认设备
 SAMPLE_RATE = 16000  # 采样率
 CHANNELS = 1  # 声道数
 WAV_FILE_PATH = "/tmp/output.wav"
+CAPTURE_RING_SECONDS = 10  # 共享采集环形缓冲区保留的音频时长（秒）
+CAPTURE_PREROLL_SECONDS = 0.3  # 检测到指令语音开始时向前补录的时长（秒），只回溯到唤醒词所在帧之后
+CAPTURE_SKIP_ACK_AUDIO = True  # 剔除唤醒提示语播放期间录到的音频（保留预录部分），避免录入音箱回声
+PIPELINE_QUEUE_SIZE = 1  # 交互流水线每个阶段的队列容量
+BARGE_IN = True  # 交互进行中再次唤醒时打断当前播放和请求
+WAKE_WORD_TEXTS = ["豆豆"]  # 唤醒词的文字形式，助手自己说出这些词时忽略唤醒，避免被自己的声音打断
+SELF_TRIGGER_TAIL = 0.6  # 含唤醒词的语句播放结束后继续忽略唤醒的时长（秒），覆盖检测延迟和回声
 
 # 语音识别配置
 DEFAULT_LANGUAGE = "zh-CN"  # 默认语言
 RECOGNITION_TIMEOUT = 5  # 语音识别超时时间（秒）
+STT_STREAMING = True  # 录音的同时进行Vosk流式识别
+ENDPOINT_MODE = "adaptive"  # 断句模式：adaptive 结合识别结果自适应等待，fixed 固定等待3秒静音
+ENDPOINT_SHORT_HANGOVER = 0.5  # 句子听起来已完整时的尾部静音等待（秒）
+ENDPOINT_LONG_HANGOVER = 1.2  # 句子说到一半时的尾部静音等待（秒）
+DEBUG_SAVE_AUDIO = False  # 调试用：将录到的指令音频保存到tmp目录
 
 # LLM 模型
 LLM_HOST = os.getenv("LLM_HOST", "http://localhost:11434")
+LLM_HOSTS = [host.strip() for host in os.getenv("LLM_HOSTS", LLM_HOST).split(",") if host.strip()]  # 多个Ollama服务，逗号分隔
+LLM_HEDGE_DELAY = None  # 首选服务超过该时间（秒）仍未响应时向下一个服务发出对冲请求，None表示不对冲
+LLM_PROBE_INTERVAL = 15  # 后台健康探测间隔（秒）
 LLM_REQUEST_TIMEOUT = 90
 LLM_MODEL_NAME = "gemma3" # qwen3 gemma3 deepseek-r1:8b
+LLM_STREAM = True  # 流式输出，边生成边播放
+LLM_CHAT_MODE = True  # 使用/api/chat多轮对话；False时使用/api/generate（配合LLM_REUSE_CONTEXT）
+LLM_CONTEXT_BUDGET_CHARS = 1200  # 对话模式下携带的历史对话字符数上限
+LLM_CONTEXT_COLLAPSE_CHARS = 40  # 超出预算时较早的回复压缩后保留的字数
+LLM_REUSE_CONTEXT = True  # 生成模式下会话内复用Ollama返回的context，避免每轮重复处理角色设定
+LLM_KEEP_ALIVE = "30m"  # 模型在Ollama内存中的保留时间，"-1"表示常驻
+LLM_PRELOAD = True  # 启动时预加载模型
+LLM_WARMUP_ON_WAKE = True  # 检测到唤醒词时在后台预热模型
+LLM_CACHE = True  # 缓存大模型回复，重复的问题直接作答
+LLM_CACHE_TTL = 24 * 3600  # 缓存有效期（秒）
+LLM_CACHE_MAX_ENTRIES = 256  # 内存缓存条目数
+LLM_CACHE_DB = "cache/llm_responses.db"  # 持久化缓存的SQLite数据库，None表示只用内存缓存
+LLM_CACHE_DB_MAX_ENTRIES = 2048  # 持久化缓存条目数
+LLM_SUMMARY = True  # 回复播放完后在后台把较早的对话压缩为摘要
+LLM_SUMMARY_MODEL = LLM_MODEL_NAME  # 生成摘要使用的模型，可换成更小的模型
+LLM_SUMMARY_KEEP_TURNS = 3  # 保留原文的最近轮数，更早的对话并入摘要
+LLM_SUMMARY_MAX_CHARS = 200  # 摘要字数上限
+LLM_SUMMARY_IDLE_DELAY = 8  # 助手空闲多久（秒）后才生成摘要，避免和紧接着的提问抢占模型
+LLM_SEMANTIC_CACHE = True  # 按问题的语义相似度复用已有回答（需要向量模型）
+LLM_EMBED_MODEL = "bge-m3"  # 向量模型，需先 ollama pull
+LLM_SEMANTIC_THRESHOLD = 0.92  # 余弦相似度达到该值才视为同一个问题
+LLM_SEMANTIC_CACHE_BYTES = 4 * 1024 * 1024  # 向量矩阵占用的内存上限（字节）
+
+# 唤醒应答方式：earcon 播放预先解码的短提示音（不阻塞，立即开始录音），phrase 播放语音“豆豆在呢”
+WAKE_ACK_MODE = "earcon"
+WAKE_EARCON_FILE = None  # 自定义提示音文件（WAV/OGG），None表示使用内置双音提示
+
+# “思考中”提示语：插件在预算时间内给出回复时跳过提示语，否则播放提示语并在回复就绪时提前结束
+THINKING_ACK_BUDGET = 1.0  # 等待插件回复的预算时间（秒）
+THINKING_ACK_INTERRUPT = True  # 回复就绪时是否打断正在播放的提示语
 
 # 插件配置
 PLUGINS_DIR = "plugins"  # 插件目录
 ENABLED_PLUGINS = ["time", "weather", "greeting", "llm"]  # 默认启用的插件(顺序越靠前，优先级越高，越优先被响应)
+SPECULATIVE_DISPATCH = True  # 识别出文本后立即在后台启动支持推测执行的插件（如大模型），与规则插件并行
 
 # 上下文配置
 CONTEXT_TIMEOUT = 120  # 上下文保持时间（秒）
 MAX_CONTEXT_HISTORY = 10  # 最大历史上下文数量
+SUMMARY_TIMEOUT = 30 * 60  # 对话摘要保持时间（秒）
 
 # 日志配置
 LOG_LEVEL = "INFO"  # 日志级别
@@ -60,11 +109,33 @@ PORCUPINE_ACCESS_KEY = os.getenv("PORCUPINE_ACCESS_KEY", "")
 os.makedirs("resources/models", exist_ok=True)
 os.makedirs("logs", exist_ok=True)
 TTS_TO_SPEECH_TMP_DIR = "tmp"
-TTS_TO_SPEECH_FILENAME = "speech.mp3"
 if os.path.exists(TTS_TO_SPEECH_TMP_DIR):
     shutil.rmtree(TTS_TO_SPEECH_TMP_DIR)
 os.makedirs(TTS_TO_SPEECH_TMP_DIR, exist_ok=True)
 
+# 流式语音播放：边合成边播放，需要能从标准输入解码MP3的播放器（如mpg123、ffplay）
+TTS_STREAMING = True
+TTS_STREAM_PLAYER = ["mpg123", "-q", "-"]  # 也可使用 ["ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet", "-"]
+
+# 长文本按句流水线合成：播放当前句时提前合成后续句子
+TTS_SENTENCE_PIPELINE = True
+TTS_PIPELINE_LOOKAHEAD = 2  # 提前合成的句子数
+TTS_MIN_SENTENCE_CHARS = 4  # 单句最少字符数，过短的片段与后文合并
+
+# 在线语音合成熔断：连续失败或首包过慢达到阈值后直接使用离线引擎，并在后台探测恢复
+TTS_ONLINE_TIMEOUT = 3.0  # 在线合成等待首个音频块的超时时间（秒）
+TTS_BREAKER_FAILURE_THRESHOLD = 2  # 触发熔断的连续失败/过慢次数
+TTS_BREAKER_SLOW_THRESHOLD = 2.0  # 首包耗时超过该值（秒）视为过慢
+TTS_PROBE_INTERVAL = 30  # 熔断后探测在线服务的间隔（秒）
+TTS_PROBE_TEXT = "你好"  # 探测用的文本
+TTS_LATENCY_WINDOW = 20  # 耗时统计的滑动窗口大小
+
+# 语音合成缓存
+TTS_CACHE_DIR = "cache/tts"  # 磁盘缓存目录（不随tmp目录在启动时清空）
+TTS_CACHE_MEMORY_BYTES = 8 * 1024 * 1024  # 内存缓存容量（字节）
+TTS_CACHE_DISK_BYTES = 64 * 1024 * 1024  # 磁盘缓存容量（字节）
+TTS_CACHE_PREWARM = True  # 启动时预先合成固定提示语
+
 # 默认音色以及可用音色列表
 TTS_ENGINE_ROLE_DEFAULT    = "zh-CN-XiaoyouNeural"
 TTS_ENGINE_ROLE_XIAOXIAO   = "zh-CN-XiaoxiaoNeural",      # 默认，自然; 晓晓（女）
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+音频采集：常驻采集线程 + 共享PCM环形缓冲区
+"""
+
+import threading
+import numpy as np
+from pvrecorder import PvRecorder
+
+
+class AudioRingBuffer:
+    """
+    固定大小的PCM环形缓冲区，写入位置按样本数单调递增，各个读者通过独立的游标读取
+    """
+
+    def __init__(self, capacity):
+        """
+        初始化环形缓冲区
+
+        Args:
+            capacity: 缓冲区可容纳的样本数
+        """
+        self.capacity = capacity
+        self.data = np.zeros(capacity, dtype=np.int16)
+        self.position = 0  # 累计写入的样本数
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def write(self, samples):
+        """
+        写入一段int16样本，并唤醒等待中的读者
+        """
+        samples = np.asarray(samples, dtype=np.int16)
+        with self.condition:
+            n = len(samples)
+            if n > self.capacity:
+                samples = samples[-self.capacity:]
+                self.position += n - self.capacity
+                n = self.capacity
+            start = self.position % self.capacity
+            first = min(n, self.capacity - start)
+            self.data[start:start + first] = samples[:first]
+            self.data[:n - first] = samples[first:]
+            self.position += n
+            self.condition.notify_all()
+
+    def oldest(self):
+        """
+        缓冲区中仍然可读的最早位置
+        """
+        return max(0, self.position - self.capacity)
+
+    def _copy(self, start, n):
+        """
+        复制 [start, start + n) 区间的样本，调用方需持有锁并保证区间有效
+        """
+        offset = start % self.capacity
+        first = min(n, self.capacity - offset)
+        out = np.empty(n, dtype=np.int16)
+        out[:first] = self.data[offset:offset + first]
+        out[first:] = self.data[:n - first]
+        return out
+
+    def cursor(self, start=None):
+        """
+        创建一个读取游标
+
+        Args:
+            start: 起始位置，None表示从当前写入位置开始；早于缓冲区范围时自动截断
+
+        Returns:
+            RingCursor: 读取游标
+        """
+        with self.condition:
+            if start is None:
+                start = self.position
+            return RingCursor(self, max(start, self.oldest()))
+
+    def close(self):
+        """
+        关闭缓冲区，唤醒所有等待中的读者
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class RingCursor:
+    """
+    环形缓冲区的独立读取游标，读者落后超过缓冲区长度时跳过并记录丢弃的样本数
+    """
+
+    def __init__(self, ring, position):
+        self.ring = ring
+        self.position = position
+        self.dropped = 0  # 因读取过慢被覆盖而丢弃的样本数
+        self._prefix = None  # skip()时保留下来、尚未读取的样本
+
+    def read(self, n, timeout=None):
+        """
+        读取n个样本，数据不足时阻塞等待
+
+        Args:
+            n: 样本数
+            timeout: 最长等待时间（秒），None表示一直等待
+
+        Returns:
+            numpy.ndarray: int16样本；超时或缓冲区已关闭时返回None
+        """
+        ring = self.ring
+        with ring.condition:
+            head = self._prefix
+            if head is not None:
+                if len(head) >= n:
+                    self._prefix = head[n:] if len(head) > n else None
+                    return head[:n]
+                n -= len(head)
+            if not ring.condition.wait_for(
+                    lambda: ring.closed or ring.position >= self.position + n, timeout):
+                return None
+            if ring.position < self.position + n:
+                return None
+            self._prefix = None
+            oldest = ring.oldest()
+            if self.position < oldest:
+                self.dropped += oldest - self.position
+                self.position = oldest
+            samples = ring._copy(self.position, n)
+            self.position += n
+            return samples if head is None else np.concatenate([head, samples])
+
+    def read_bytes(self, n, timeout=None):
+        """
+        读取n个样本并以bytes形式返回
+        """
+        samples = self.read(n, timeout)
+        return None if samples is None else samples.tobytes()
+
+    def seek(self, position):
+        """
+        移动游标到指定位置（不早于缓冲区中最早的数据）
+        """
+        with self.ring.condition:
+            self._prefix = None
+            self.position = max(position, self.ring.oldest())
+
+    def skip(self, start, end):
+        """
+        跳过 [start, end) 区间：之前的样本保留下来照常读取，之后从end继续读取
+        （用于剔除提示音播放期间录到的回声，同时保留唤醒词后的预录音频）
+
+        Args:
+            start: 区间起点，应已写入缓冲区
+            end: 区间终点，可以晚于当前写入位置
+        """
+        ring = self.ring
+        with ring.condition:
+            oldest = ring.oldest()
+            if self.position < oldest:
+                self.dropped += oldest - self.position
+                self.position = oldest
+            start = min(start, ring.position)
+            if start > self.position:
+                kept = ring._copy(self.position, start - self.position)
+                self._prefix = kept if self._prefix is None else np.concatenate([self._prefix, kept])
+            self.position = max(end, oldest)
+
+    def lag(self):
+        """
+        尚未读取的样本数
+        """
+        pending = len(self._prefix) if self._prefix is not None else 0
+        return self.ring.position - self.position + pending
+
+
+class AudioCapture:
+    """
+    常驻采集线程：持续从麦克风读取音频写入环形缓冲区，唤醒词检测、VAD和识别器共享同一路音频
+    """
+
+    def __init__(self, frame_length, device_index=-1, rate=16000, ring_seconds=10):
+        """
+        初始化音频采集
+
+        Args:
+            frame_length: 每次从设备读取的样本数
+            device_index: 录音设备索引，-1表示默认设备
+            rate: 采样率（PvRecorder固定为16000）
+            ring_seconds: 环形缓冲区保留的音频时长（秒）
+        """
+        self.rate = rate
+        self.recorder = PvRecorder(frame_length=frame_length, device_index=device_index)
+        self.ring = AudioRingBuffer(int(rate * ring_seconds))
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """
+        启动采集线程
+        """
+        if self.running:
+            return
+        self.running = True
+        self.recorder.start()
+        self.thread = threading.Thread(target=self._run, name="audio-capture", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        """
+        采集循环
+        """
+        try:
+            while self.running:
+                self.ring.write(self.recorder.read())
+        except Exception as e:
+            if self.running:
+                print(f"音频采集错误: {e}")
+        finally:
+            self.ring.close()
+
+    def cursor(self, start=None, preroll=0.0):
+        """
+        创建读取游标
+
+        Args:
+            start: 起始位置，None表示当前写入位置
+            preroll: 向前回溯的时长（秒）
+
+        Returns:
+            RingCursor: 读取游标
+        """
+        if start is None:
+            start = self.ring.position
+        return self.ring.cursor(start - int(preroll * self.rate))
+
+    def stop(self):
+        """
+        停止采集并释放设备
+        """
+        if not self.running:
+            return
+        self.running = False
+        self.recorder.stop()
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+        self.recorder.delete()
+        self.ring.close()
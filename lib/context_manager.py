@@ -5,8 +5,9 @@
 上下文管理工具类
 """
 
+import threading
 import time
-from config.config import CONTEXT_TIMEOUT, MAX_CONTEXT_HISTORY
+from config.config import CONTEXT_TIMEOUT, MAX_CONTEXT_HISTORY, SUMMARY_TIMEOUT
 
 
 class Context:
@@ -26,6 +27,15 @@ class Context:
         self.system_response = system_response
         self.timestamp = time.time()
 
+    def append_response(self, chunk):
+        """
+        追加流式生成的响应片段
+
+        Args:
+            chunk: 响应文本片段
+        """
+        self.system_response = (self.system_response or "") + chunk
+
 
 class ContextManager:
     """
@@ -37,6 +47,27 @@ class ContextManager:
         初始化上下文管理器
         """
         self.context_history = []  # 上下文历史
+        self.session_id = 0  # 会话编号，上下文超时或清空后递增
+        self.summary = ""  # 较早对话的滚动摘要
+        self.summary_updated_at = 0
+        self.pending = []  # 因超出数量或超时移出历史、尚未并入摘要的上下文
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        """
+        本次处理是否已被放弃，直接处理时总为False（推测执行时由DeferredContextManager反映取消状态）
+        """
+        return False
+
+    def on_commit(self, callback):
+        """
+        登记处理结果被采用后才执行的副作用（如写入缓存），直接处理时立即执行
+
+        Args:
+            callback: 无参数的回调函数
+        """
+        callback()
     
     def add_context(self, user_input, system_response=None):
         """
@@ -45,14 +76,39 @@ class ContextManager:
         Args:
             user_input: 用户输入的文本
             system_response: 系统的响应文本
+
+        Returns:
+            Context: 新添加的上下文，流式响应可通过append_response继续追加
         """
         # 创建新的上下文
-        context = Context(user_input, system_response)
-        # 添加到历史记录
-        self.context_history.append(context)
-        # 保持历史记录不超过最大数量
-        if len(self.context_history) > MAX_CONTEXT_HISTORY:
-            self.context_history = self.context_history[-MAX_CONTEXT_HISTORY:]
+        return self.append_context(Context(user_input, system_response))
+
+    def append_context(self, context):
+        """
+        添加已创建的上下文（如推测执行被采用时补记的上下文）
+
+        Args:
+            context: Context实例
+
+        Returns:
+            Context: 传入的上下文
+        """
+        with self._lock:
+            # 添加到历史记录
+            self.context_history.append(context)
+            # 保持历史记录不超过最大数量，移出的上下文等待并入摘要
+            if len(self.context_history) > MAX_CONTEXT_HISTORY:
+                self._add_pending(self.context_history[:-MAX_CONTEXT_HISTORY])
+                self.context_history = self.context_history[-MAX_CONTEXT_HISTORY:]
+        return context
+
+    def _add_pending(self, contexts):
+        """
+        记录待摘要的上下文，调用方需持有锁；摘要长期失败时只保留最近的一部分
+        """
+        self.pending.extend(ctx for ctx in contexts if ctx.system_response)
+        if len(self.pending) > MAX_CONTEXT_HISTORY:
+            self.pending = self.pending[-MAX_CONTEXT_HISTORY:]
     
     def get_recent_contexts(self, max_count=None):
         """
@@ -95,11 +151,89 @@ class ContextManager:
         
         return context_text
     
+    def get_messages(self, budget, collapse_chars=40):
+        """
+        把有效的历史对话转换为/api/chat的消息列表，总字符数不超过预算：
+        超出预算时先从最早的轮次开始把回复压缩为开头的若干字，仍超出时再从最早的轮次开始丢弃
+
+        Args:
+            budget: 历史消息的字符数上限
+            collapse_chars: 压缩后保留的回复字数
+
+        Returns:
+            list: [{"role": "user"/"assistant", "content": ...}, ...]，按时间顺序排列
+        """
+        turns = [
+            [ctx.user_input, ctx.system_response]
+            for ctx in self.get_recent_contexts()
+            if ctx.user_input and ctx.system_response
+        ]
+
+        def cost():
+            return sum(len(user) + len(response) for user, response in turns)
+
+        # 先压缩最早的回复
+        for turn in turns:
+            if cost() <= budget:
+                break
+            if len(turn[1]) > collapse_chars:
+                turn[1] = turn[1][:collapse_chars] + "……"
+        # 仍然超出时丢弃最早的轮次
+        while turns and cost() > budget:
+            turns.pop(0)
+
+        messages = []
+        for user, response in turns:
+            messages.append({"role": "user", "content": user})
+            messages.append({"role": "assistant", "content": response})
+        return messages
+
+    def get_summary(self):
+        """
+        获取较早对话的摘要，超过SUMMARY_TIMEOUT未更新时视为失效
+
+        Returns:
+            str: 摘要文本，没有时返回空字符串
+        """
+        if self.summary and time.time() - self.summary_updated_at < SUMMARY_TIMEOUT:
+            return self.summary
+        return ""
+
+    def get_aged_contexts(self, keep_recent):
+        """
+        获取需要并入摘要的上下文：已移出历史的上下文，加上最近keep_recent轮之前的历史
+
+        Returns:
+            list: 按时间顺序排列的上下文
+        """
+        with self._lock:
+            history = self.context_history[:-keep_recent] if keep_recent > 0 else self.context_history
+            return self.pending + [ctx for ctx in history if ctx.system_response]
+
+    def commit_summary(self, summary, contexts):
+        """
+        更新摘要，并把已并入摘要的上下文从历史和待摘要列表中移除
+
+        Args:
+            summary: 新的摘要
+            contexts: 已并入摘要的上下文（get_aged_contexts的返回值）
+        """
+        merged = set(map(id, contexts))
+        with self._lock:
+            self.summary = summary
+            self.summary_updated_at = time.time()
+            self.pending = [ctx for ctx in self.pending if id(ctx) not in merged]
+            self.context_history = [ctx for ctx in self.context_history if id(ctx) not in merged]
+
     def clear_context(self):
         """
-        清空上下文历史
+        清空上下文历史和摘要
         """
-        self.context_history = []
+        with self._lock:
+            self.context_history = []
+            self.pending = []
+            self.summary = ""
+        self.session_id += 1
     
     def check_timeout(self):
         """
@@ -109,11 +243,20 @@ class ContextManager:
             bool: 是否所有上下文都已超时
         """
         current_time = time.time()
-        # 过滤有效上下文
-        self.context_history = [
-            ctx for ctx in self.context_history 
-            if current_time - ctx.timestamp < CONTEXT_TIMEOUT
-        ]
+        had_context = len(self.context_history) > 0
+        with self._lock:
+            # 过滤有效上下文，超时的上下文等待并入摘要
+            self._add_pending(
+                ctx for ctx in self.context_history
+                if current_time - ctx.timestamp >= CONTEXT_TIMEOUT
+            )
+            self.context_history = [
+                ctx for ctx in self.context_history
+                if current_time - ctx.timestamp < CONTEXT_TIMEOUT
+            ]
+        # 所有上下文都已超时，开始新的会话
+        if had_context and len(self.context_history) == 0:
+            self.session_id += 1
         
         # 返回是否还有有效上下文
         return len(self.context_history) == 0
\ No newline at end of file
@@ -1,27 +1,446 @@
+import json
+import queue
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
+
+
+class OllamaStream:
+    """
+    Ollama流式响应：逐行解析NDJSON并逐个产出文本片段，
+    迭代结束后可通过stats获取最终的统计记录（耗时、token数、context等）
+    """
+
+    def __init__(self, response, on_close=None):
+        self.response = response
+        self.on_close = on_close
+        self.text = ""  # 已收到的完整文本
+        self.stats = None  # 最后一条done=true的记录
+        self.closed = False
+
+    @staticmethod
+    def _token(record):
+        # /api/generate 返回 response 字段，/api/chat 返回 message.content
+        if 'message' in record:
+            return record['message'].get('content', '')
+        return record.get('response', '')
+
+    def __iter__(self):
+        try:
+            for line in self.response.iter_lines():
+                if not line:
+                    continue
+                record = json.loads(line)
+                if record.get('error'):
+                    raise RuntimeError(record['error'])
+                token = self._token(record)
+                if token:
+                    self.text += token
+                    yield token
+                if record.get('done'):
+                    self.stats = record
+                    break
+        except (requests.exceptions.RequestException, AttributeError, ValueError):
+            # 被close()中断时连接已关闭，直接结束
+            if not self.closed:
+                raise
+        finally:
+            self.close()
+
+    def close(self):
+        """关闭连接，正在进行的生成会被中断"""
+        if self.closed:
+            return
+        self.closed = True
+        if self.on_close is not None:
+            self.on_close(self)
+        self.response.close()
+
+
+class OllamaBackend:
+    """
+    单个Ollama服务：独立的keep-alive连接池，记录健康状态、探测延迟和进行中的请求数
+    """
+
+    def __init__(self, url, pool_size=4, failure_threshold=2):
+        self.url = url.rstrip('/')
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.failure_threshold = failure_threshold
+        self.healthy = True
+        self.failures = 0  # 连续失败次数
+        self.inflight = 0  # 进行中的请求数
+        self.latency = None  # 探测延迟的指数滑动平均（秒）
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            self.inflight += 1
+            self.requests += 1
+
+    def release(self):
+        with self._lock:
+            self.inflight -= 1
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.healthy = True
+
+    def record_failure(self):
+        """记录一次失败，连续失败达到阈值后标记为不可用，由后台探测恢复"""
+        with self._lock:
+            self.failures += 1
+            self.errors += 1
+            if self.failures >= self.failure_threshold:
+                self.healthy = False
+
+    def probe(self, timeout=5):
+        """探测服务是否可用并更新延迟"""
+        start = time.time()
+        try:
+            ok = self.session.get(f"{self.url}/api/tags", timeout=timeout).status_code == 200
+        except requests.exceptions.RequestException:
+            ok = False
+        latency = time.time() - start
+        with self._lock:
+            self.healthy = ok
+            if ok:
+                self.failures = 0
+                self.latency = latency if self.latency is None else 0.7 * self.latency + 0.3 * latency
+        return ok
+
+    def score(self):
+        """路由优先级，越小越优先：先比较进行中的请求数，再比较探测延迟"""
+        return self.inflight, self.latency if self.latency is not None else float('inf')
+
+    def get_stats(self):
+        return {
+            'healthy': self.healthy,
+            'inflight': self.inflight,
+            'latency': round(self.latency, 3) if self.latency is not None else None,
+            'requests': self.requests,
+            'errors': self.errors,
+        }
+
+
+class OllamaBackendPool:
+    """
+    多个Ollama服务组成的后端池：后台线程定期探测各服务的健康状态和延迟，
+    请求优先路由到健康且负载最低的服务；同一组地址在进程内共享一个后端池
+    """
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, hosts, probe_interval=15, probe_timeout=5):
+        self.backends = [OllamaBackend(host) for host in hosts]
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.running = True
+        self.check()
+        if probe_interval:
+            threading.Thread(target=self._probe_loop, name="ollama-probe", daemon=True).start()
+
+    @classmethod
+    def shared(cls, hosts, probe_interval=15):
+        """获取（或创建）给定地址列表对应的后端池"""
+        key = tuple(hosts)
+        with cls._shared_lock:
+            pool = cls._shared.get(key)
+            if pool is None:
+                pool = cls._shared[key] = cls(hosts, probe_interval=probe_interval)
+            return pool
+
+    def check(self):
+        """
+        并行探测所有服务
+
+        Returns:
+            bool: 是否至少有一个服务可用
+        """
+        threads = [threading.Thread(target=backend.probe, args=(self.probe_timeout,), daemon=True)
+                   for backend in self.backends]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return any(backend.healthy for backend in self.backends)
+
+    def is_available(self):
+        """最近一次探测时是否至少有一个服务可用"""
+        return any(backend.healthy for backend in self.backends)
+
+    def _probe_loop(self):
+        while self.running:
+            time.sleep(self.probe_interval)
+            self.check()
+
+    def candidates(self, exclude=()):
+        """
+        按路由优先级排列的候选服务：健康的服务按负载和延迟排序，全部不可用时仍按顺序尝试
+
+        Args:
+            exclude: 本次请求已经尝试过的服务
+        """
+        remaining = [backend for backend in self.backends if backend not in exclude]
+        healthy = [backend for backend in remaining if backend.healthy]
+        return sorted(healthy or remaining, key=lambda backend: backend.score())
+
+    def stop(self):
+        self.running = False
+
+    def get_stats(self):
+        return {backend.url: backend.get_stats() for backend in self.backends}
+
 
 class OllamaClient:
-    def __init__(self, base_url="http://localhost:11434", timeout=60):
-        self.base_url = base_url
+    def __init__(self, base_url="http://localhost:11434", timeout=60, hosts=None, hedge_delay=None,
+                 probe_interval=15):
+        """
+        Args:
+            base_url: 服务地址，多个地址可用逗号分隔
+            timeout: 请求超时（秒）
+            hosts: 服务地址列表，优先于base_url
+            hedge_delay: 对冲请求的等待时间（秒）：首选服务超过该时间仍未响应时，
+                向下一个服务发出相同的请求并采用先返回的结果；None表示不对冲
+            probe_interval: 后台健康探测的间隔（秒）
+        """
+        if hosts is None:
+            hosts = [host.strip() for host in base_url.split(',') if host.strip()]
+        self.pool = OllamaBackendPool.shared(hosts, probe_interval=probe_interval)
+        self.base_url = self.pool.backends[0].url
         self.timeout = timeout
-        self.session = requests.Session()
+        self.hedge_delay = hedge_delay
+        self._inflight = set()  # 进行中请求的取消信号
+        self._streams = set()  # 进行中的流式响应
+        self.last_result = None  # 最近一次非流式生成的完整响应
+        self._cancel_count = 0  # cancel()的调用次数，用于发现发起请求期间到来的取消
+        self._warming = False  # 是否有预热请求进行中
+        self._inflight_lock = threading.Lock()
 
         # 初始化时检查服务状态
         if not self._check_service():
             print("⚠️  OLLama服务未运行，请先启动服务")
 
     def _check_service(self):
-        """检查服务状态"""
+        """检查服务状态：读取后端池的探测结果（后端池创建时已探测过，之后由后台线程定期更新）"""
+        return self.pool.is_available()
+
+    def cancel(self):
+        """取消所有进行中的请求，被取消的请求立即返回None，流式响应被关闭"""
+        with self._inflight_lock:
+            self._cancel_count += 1
+            for cancel_event in self._inflight:
+                cancel_event.set()
+            streams = list(self._streams)
+        for stream in streams:
+            stream.close()
+
+    def _post(self, path, data, stream=False):
+        """
+        发送可被cancel()打断的POST请求：按路由优先级选择服务，连接失败或服务端错误时换下一个服务重试，
+        开启对冲时首选服务响应过慢会并行请求下一个服务；请求在后台线程中执行，调用方等待结果或取消信号。
+        响应体一律按流式读取，被取消或被对冲请求淘汰的响应直接关闭连接，服务端随即停止生成
+
+        Returns:
+            tuple: (requests.Response, OllamaBackend)；被取消时响应为None。
+                流式请求的服务负载计数在响应关闭后由调用方通过backend.release()归还
+        """
+        cancel_event = threading.Event()
+        results = queue.Queue()
+        state = {'done': False}
+        state_lock = threading.Lock()
+
+        def attempt(backend):
+            backend.acquire()
+            try:
+                response = backend.session.post(f"{backend.url}{path}", json=data,
+                                                 timeout=self.timeout, stream=True)
+            except Exception as e:
+                backend.release()
+                backend.record_failure()
+                results.put((backend, None, e))
+                return
+            if response.status_code >= 500:
+                backend.record_failure()
+            else:
+                backend.record_success()
+            with state_lock:
+                if not state['done']:
+                    results.put((backend, response, None))
+                    return
+            # 已有其他服务返回结果或请求已取消，丢弃本次响应
+            response.close()
+            backend.release()
+
+        def launch(tried):
+            candidates = self.pool.candidates(exclude=tried)
+            if not candidates:
+                return False
+            tried.append(candidates[0])
+            threading.Thread(target=attempt, args=(candidates[0],), name="ollama-request", daemon=True).start()
+            return True
+
+        def finish():
+            with state_lock:
+                state['done'] = True
+            while not results.empty():
+                backend, late, _ = results.get()
+                if late is not None:
+                    late.close()
+                    backend.release()
+
+        with self._inflight_lock:
+            self._inflight.add(cancel_event)
+        try:
+            tried = []
+            launch(tried)
+            running = 1
+            started = time.time()
+            last_error = None
+            last_response = None
+            while running:
+                if cancel_event.is_set():
+                    print("请求已取消")
+                    finish()
+                    return None, None
+                if (self.hedge_delay is not None and running == 1 and
+                        time.time() - started > self.hedge_delay and launch(tried)):
+                    running += 1
+                try:
+                    backend, response, error = results.get(timeout=0.02)
+                except queue.Empty:
+                    continue
+                running -= 1
+                if response is not None and response.status_code < 500:
+                    finish()
+                    if not stream:
+                        backend.release()
+                    return response, backend
+                # 失败：记下错误，换下一个服务
+                if response is not None:
+                    if last_response is not None:
+                        last_response.close()
+                    last_response = response
+                    backend.release()
+                last_error = error or last_error
+                if running == 0 and launch(tried):
+                    running += 1
+                    started = time.time()
+        finally:
+            with self._inflight_lock:
+                self._inflight.discard(cancel_event)
+
+        # 所有服务都失败：返回最后一个服务端错误响应，否则抛出连接错误
+        finish()
+        if last_response is not None:
+            return last_response, None
+        raise last_error
+
+    @staticmethod
+    def _apply_options(data, kwargs):
+        """
+        添加可选参数：
+            temperature: 采样温度
+            num_predict: 最多生成的token数
+            system: 系统提示词（/api/generate）
+            context: 上一轮返回的context，复用已计算的KV缓存，只需处理新增的提示词（/api/generate）
+            keep_alive: 模型在内存中的保留时间，如"30m"
+        """
+        options = {key: kwargs[key] for key in ('temperature', 'num_predict') if kwargs.get(key) is not None}
+        if options:
+            data['options'] = options
+        for key in ('system', 'context', 'keep_alive'):
+            if kwargs.get(key) is not None:
+                data[key] = kwargs[key]
+
+    def preload(self, model, keep_alive=None, background=False, embed_model=None):
+        """
+        预加载模型：发送不带提示词的生成请求，Ollama会把模型载入内存并按keep_alive保留
+
+        Args:
+            model: 模型名称
+            keep_alive: 模型在内存中的保留时间，如"30m"，None表示使用服务端默认值
+            background: 是否在后台线程中执行（不阻塞调用方）
+            embed_model: 一并载入的向量模型，None表示不载入
+
+        Returns:
+            bool: 是否加载成功；后台执行时返回是否已发起请求
+        """
+        if background:
+            with self._inflight_lock:
+                if self._warming:
+                    return False
+                self._warming = True
+            threading.Thread(target=self._preload, args=(model, keep_alive, embed_model),
+                             name="ollama-preload", daemon=True).start()
+            return True
+        return self._preload(model, keep_alive, embed_model)
+
+    def _preload(self, model, keep_alive, embed_model=None):
+        """在所有可用的服务上载入模型，任一服务都可能被路由到"""
+        requests_to_send = [("/api/generate", {"model": model})]
+        if embed_model:
+            # 向量模型不支持生成接口，用空文本的向量请求载入
+            requests_to_send.append(("/api/embeddings", {"model": embed_model, "prompt": ""}))
+        for _, data in requests_to_send:
+            if keep_alive is not None:
+                data["keep_alive"] = keep_alive
+        loaded = []
+
+        def load(backend):
+            try:
+                for path, data in requests_to_send:
+                    response = backend.session.post(f"{backend.url}{path}", json=data, timeout=self.timeout)
+                    if response.status_code != 200:
+                        print(f"预加载模型{data['model']}失败({backend.url})，状态码: {response.status_code}")
+                        return
+                loaded.append(backend)
+            except requests.exceptions.RequestException as e:
+                print(f"预加载模型失败({backend.url}): {e}")
+
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            return response.status_code == 200
-        except:
-            return False
+            threads = [threading.Thread(target=load, args=(backend,), daemon=True)
+                       for backend in self.pool.candidates()]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return bool(loaded)
+        finally:
+            with self._inflight_lock:
+                self._warming = False
+
+    def warm_up(self, model, keep_alive=None, embed_model=None):
+        """
+        非阻塞预热：唤醒时调用，在用户说话期间确保模型（及向量模型）已载入；已有预热请求进行中时忽略
+        """
+        return self.preload(model, keep_alive=keep_alive, background=True, embed_model=embed_model)
+
+    def has_model(self, model):
+        """
+        模型是否已下载到服务上
+
+        Returns:
+            bool: 是否存在；无法获取模型列表时返回None
+        """
+        models = self.list_models()
+        if models is None:
+            return None
+        names = {item.get('name') for item in models.get('models', [])}
+        return model in names or f"{model}:latest" in names
 
     def list_models(self):
         """获取模型列表 - 使用正确的API端点"""
         try:
-            response = self.session.get(f"{self.base_url}/api/tags")
+            backend = self.pool.candidates()[0]
+            response = backend.session.get(f"{backend.url}/api/tags", timeout=self.timeout)
             if response.status_code == 200:
                 return response.json()
             else:
@@ -35,68 +454,166 @@ class OllamaClient:
         """
         生成文本 - 修复的版本
         注意：确保模型名称正确
+        内部使用流式请求并汇总结果，cancel()时关闭连接，Ollama随即停止生成
         """
-        url = f"{self.base_url}/api/generate"
+        path = "/api/generate"
 
         # 构建请求数据
         data = {
             "model": model,
             "prompt": prompt,
-            "stream": False
+            "stream": True
         }
 
         # 添加可选参数
-        if 'temperature' in kwargs:
-            data['options'] = {'temperature': kwargs['temperature']}
+        self._apply_options(data, kwargs)
 
-        try:
-            print(f"发送请求到: {url}")
-            print(f"使用模型: {model}")
-            print(f"提示词: {prompt[:50]}...")
+        print(f"使用模型: {model}")
+        print(f"提示词: {prompt[:50]}...")
 
-            response = self.session.post(
-                url,
-                json=data,
-                timeout=self.timeout
-            )
+        result = self._collect(path, data)
+        if result is None:
+            return None
+        self.last_result = result
+        if result.get('response', "") != "":
+            return result['response']
+        return None
 
-            print(f"响应状态码: {response.status_code}")
+    def chat_completion(self, model, messages, **kwargs):
+        """聊天补全（内部使用流式请求并汇总结果，可被cancel()中断）"""
+        data = {
+            "model": model,
+            "messages": messages,
+            "stream": True
+        }
+        self._apply_options(data, kwargs)
 
-            if response.status_code == 200:
-                if response.json().get('response', "") != "":
-                    return response.json()['response']
-            elif response.status_code == 404:
-                print("❌ 404错误: 可能是模型名称不正确或API端点变化")
-                print("请检查:")
-                print("1. 模型名称是否正确")
-                print("2. Ollama服务版本")
-                return None
-            else:
-                print(f"❌ 请求失败，状态码: {response.status_code}")
-                print(f"响应内容: {response.text}")
-                return None
+        result = self._collect("/api/chat", data)
+        if result is None:
+            return None
+        self.last_result = result
+        return self.last_result
 
-        except requests.exceptions.RequestException as e:
+    def _collect(self, path, data):
+        """
+        发送流式请求并汇总为非流式响应的格式（最终统计记录 + 完整文本）
+
+        Returns:
+            dict: 完整响应；请求失败或被取消时返回None
+        """
+        stream = self._open_stream(path, data)
+        if stream is None:
+            return None
+        try:
+            for _ in stream:
+                pass
+        except (requests.exceptions.RequestException, RuntimeError, ValueError) as e:
             print(f"❌ 请求异常: {e}")
             return None
+        finally:
+            stream.close()
+        if stream.stats is None:
+            # 被cancel()中断
+            return None
+        result = dict(stream.stats)
+        if 'message' in result:
+            result['message'] = dict(result['message'], content=stream.text)
+        else:
+            result['response'] = stream.text
+        return result
 
-    def chat_completion(self, model, messages, **kwargs):
-        """聊天补全"""
-        url = f"{self.base_url}/api/chat"
+    def _open_stream(self, path, data):
+        """发送流式请求，返回OllamaStream；失败或被取消时返回None"""
+        with self._inflight_lock:
+            cancel_count = self._cancel_count
+        try:
+            response, backend = self._post(path, data, stream=True)
+        except requests.exceptions.RequestException as e:
+            print(f"❌ 流式请求异常: {e}")
+            return None
+        if response is None:
+            return None
+        if response.status_code != 200:
+            print(f"❌ 流式请求失败，状态码: {response.status_code}")
+            if response.status_code == 404:
+                print("❌ 404错误: 可能是模型名称不正确或API端点变化，请检查模型名称和Ollama服务版本")
+            response.close()
+            if backend is not None:
+                backend.release()
+            return None
+
+        def forget(stream):
+            with self._inflight_lock:
+                self._streams.discard(stream)
+            backend.release()
+
+        stream = OllamaStream(response, on_close=forget)
+        with self._inflight_lock:
+            self._streams.add(stream)
+            # 请求返回与登记之间到来的取消
+            cancelled = self._cancel_count != cancel_count
+        if cancelled:
+            stream.close()
+            return None
+        return stream
+
+    def generate_stream(self, model, prompt, **kwargs):
+        """
+        流式生成文本
+
+        Returns:
+            OllamaStream: 迭代产出文本片段，结束后stats为最终统计记录；请求失败时返回None
+        """
+        data = {
+            "model": model,
+            "prompt": prompt,
+            "stream": True
+        }
+        self._apply_options(data, kwargs)
+        return self._open_stream("/api/generate", data)
 
+    def chat_stream(self, model, messages, **kwargs):
+        """
+        流式聊天补全
+
+        Returns:
+            OllamaStream: 迭代产出文本片段，结束后stats为最终统计记录；请求失败时返回None
+        """
         data = {
             "model": model,
             "messages": messages,
-            "stream": False
+            "stream": True
         }
+        self._apply_options(data, kwargs)
+        return self._open_stream("/api/chat", data)
+
+    def get_stats(self):
+        """
+        获取各服务的健康状态、负载和延迟
+        """
+        return self.pool.get_stats()
+
+    def embed(self, model, text, keep_alive=None):
+        """
+        计算文本的向量表示（/api/embeddings）
 
+        Returns:
+            list: 向量；请求失败或被取消时返回None
+        """
+        data = {
+            "model": model,
+            "prompt": text
+        }
+        if keep_alive is not None:
+            data["keep_alive"] = keep_alive
         try:
-            response = self.session.post(url, json=data, timeout=self.timeout)
-            if response.status_code == 200:
-                return response.json()
-            else:
-                print(f"聊天请求失败，状态码: {response.status_code}")
+            response, _ = self._post("/api/embeddings", data)
+            if response is None:
                 return None
-        except Exception as e:
-            print(f"聊天请求错误: {e}")
-            return None
\ No newline at end of file
+            if response.status_code == 200:
+                return response.json().get('embedding') or None
+            print(f"向量请求失败，状态码: {response.status_code}")
+            return None
+        except requests.exceptions.RequestException as e:
+            print(f"向量请求错误: {e}")
+            return None
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+交互流水线：各阶段通过有界队列连接，每个阶段由独立的工作线程处理
+"""
+
+import itertools
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger('DoudouAssistant')
+
+
+class Interaction:
+    """
+    一次交互，在流水线各阶段之间传递
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, wake_position=None):
+        """
+        初始化交互
+
+        Args:
+            wake_position: 唤醒词所在帧在环形缓冲区中的位置
+        """
+        self.id = next(self._ids)
+        self.wake_position = wake_position
+        self.created_at = time.time()
+        self.utterance = None  # 录到的指令音频
+        self.recognizer = None  # 流式识别器
+        self.user_input = None  # 识别出的文本
+        self.response_chunks = None  # 插件生成的回复片段（流式）
+        self.response = None  # 完整回复
+        self.timings = {}  # 各阶段耗时（秒）
+        self.cancel_event = threading.Event()  # 被打断时置位
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        """
+        打断本次交互，后续阶段不再处理
+        """
+        self.cancel_event.set()
+
+
+class Stage:
+    """
+    流水线阶段：一个有界队列加一个工作线程
+    """
+
+    def __init__(self, name, handler, maxsize=1):
+        """
+        初始化阶段
+
+        Args:
+            name: 阶段名称
+            handler: 处理函数，接收Interaction，返回交给下一阶段的Interaction，返回None表示结束
+            maxsize: 队列容量
+        """
+        self.name = name
+        self.handler = handler
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.next_stage = None
+        self.pipeline = None
+        self.processed = 0
+        self.dropped = 0
+        self.running = False
+        self.thread = None
+
+    def submit(self, item, block=False):
+        """
+        提交任务到本阶段
+
+        Args:
+            item: Interaction
+            block: 队列满时是否等待；不等待时直接丢弃
+
+        Returns:
+            bool: 是否提交成功
+        """
+        try:
+            self.queue.put(item, block=block)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=f"stage-{self.name}", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while self.running:
+            try:
+                item = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is None:
+                break
+            if item.cancelled:
+                # 已被打断的交互直接结束，不再进入后续阶段
+                self.pipeline.finish(item)
+                continue
+            start = time.time()
+            try:
+                result = self.handler(item)
+            except Exception as e:
+                result = None
+                if not item.cancelled:
+                    self.pipeline.handle_error(item, e)
+            item.timings[self.name] = time.time() - start
+            self.processed += 1
+
+            if result is not None and not item.cancelled and self.next_stage is not None:
+                # 阶段之间阻塞传递，由下游反压
+                self.next_stage.submit(result, block=True)
+            else:
+                self.pipeline.finish(item)
+
+    def stop(self):
+        """
+        通知工作线程退出（不阻塞：队列已满时由running标记结束循环）
+        """
+        self.running = False
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+
+class InteractionPipeline:
+    """
+    交互流水线：VAD录音 → 语音识别 → 插件处理 → 语音播放
+    """
+
+    def __init__(self, stages, on_error=None, on_finish=None, maxsize=1):
+        """
+        初始化流水线
+
+        Args:
+            stages: [(阶段名称, 处理函数), ...]，按执行顺序排列
+            on_error: 阶段处理出错时的回调，参数为(Interaction, Exception)
+            on_finish: 交互结束（含被打断）时的回调，用于释放资源
+            maxsize: 每个阶段的队列容量
+        """
+        self.stages = [Stage(name, handler, maxsize=maxsize) for name, handler in stages]
+        for stage, next_stage in zip(self.stages, self.stages[1:]):
+            stage.next_stage = next_stage
+        for stage in self.stages:
+            stage.pipeline = self
+        self.on_error = on_error
+        self.on_finish = on_finish
+        self.in_flight = 0
+        self.completed = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def stop(self):
+        for stage in self.stages:
+            stage.stop()
+
+    def submit(self, item):
+        """
+        提交一次交互到第一个阶段（不阻塞，队列满时丢弃）
+
+        Returns:
+            bool: 是否提交成功
+        """
+        with self._lock:
+            if not self.stages[0].submit(item):
+                return False
+            self.in_flight += 1
+        return True
+
+    def is_busy(self):
+        """
+        是否有交互正在处理
+        """
+        return self.in_flight > 0
+
+    def finish(self, item):
+        """
+        交互结束（正常完成或中途终止）
+        """
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+        logger.info(f"交互{item.id}{'被打断' if item.cancelled else '结束'}，各阶段耗时: " +
+                    ", ".join(f"{name}={cost:.2f}s" for name, cost in item.timings.items()))
+        if self.on_finish is not None:
+            try:
+                self.on_finish(item)
+            except Exception as e:
+                logger.warning(f"交互收尾失败: {e}")
+
+    def handle_error(self, item, error):
+        logger.error(f"交互{item.id}处理出错: {error}")
+        if self.on_error is not None:
+            try:
+                self.on_error(item, error)
+            except Exception as e:
+                logger.warning(f"错误处理失败: {e}")
+
+    def get_metrics(self):
+        """
+        获取流水线指标
+
+        Returns:
+            dict: 各阶段队列深度、处理数和丢弃数
+        """
+        return {
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'stages': {
+                stage.name: {
+                    'depth': stage.queue.qsize(),
+                    'processed': stage.processed,
+                    'dropped': stage.dropped,
+                }
+                for stage in self.stages
+            },
+        }
@@ -6,9 +6,10 @@
 """
 
 import os
+import asyncio
 import importlib.util
 import inspect
-from config.config import PLUGINS_DIR, ENABLED_PLUGINS
+from config.config import PLUGINS_DIR, ENABLED_PLUGINS, SPECULATIVE_DISPATCH
 
 
 class PluginManager:
@@ -96,23 +97,144 @@ class PluginManager:
         Returns:
             str: 插件生成的响应文本，如果没有插件处理则返回None
         """
-        for _, plugin in self.plugins:
-            try:
-                # 检查插件是否可以处理该输入
-                if hasattr(plugin, 'can_handle'):
-                    if not plugin.can_handle(user_input, context_manager):
+        response = "".join(self.process_input_stream(user_input, context_manager))
+        return response or None
+
+    def process_input_stream(self, user_input, context_manager):
+        """
+        处理用户输入，逐段产出插件生成的响应文本；插件返回字符串时整段产出，
+        返回生成器或异步迭代器时边生成边产出
+
+        Args:
+            user_input: 用户输入的文本
+            context_manager: 上下文管理器实例
+
+        Returns:
+            generator: 响应文本片段，如果没有插件处理则不产出任何片段
+        """
+        speculations = self._speculate(user_input, context_manager) if SPECULATIVE_DISPATCH else {}
+        try:
+            for _, plugin in self.plugins:
+                plugin_name = getattr(plugin, 'plugin_name', 'unknown')
+                speculation = speculations.pop(id(plugin), None)
+                try:
+                    # 检查插件是否可以处理该输入
+                    if hasattr(plugin, 'can_handle'):
+                        if not plugin.can_handle(user_input, context_manager):
+                            if speculation is not None:
+                                speculation.cancel()
+                            continue
+
+                    # 调用插件的处理方法，已推测执行的插件直接采用后台的结果
+                    if speculation is not None:
+                        response = speculation.result()
+                    else:
+                        response = plugin.handle(user_input, context_manager)
+                    if not response:
                         continue
-                
-                # 调用插件的处理方法
-                response = plugin.handle(user_input, context_manager)
-                if response:
-                    return response
+                    if isinstance(response, str):
+                        self._cancel_speculations(speculations)
+                        yield response
+                        return
+
+                    # 流式响应：先取到第一个非空片段，确认插件确实给出了回复
+                    chunks = self._iter_chunks(response)
+                    first = next((chunk for chunk in chunks if chunk), None)
+                    if first is None:
+                        continue
+                except Exception as e:
+                    print(f"插件 {plugin_name} 执行错误: {e}")
+                    continue
+
+                # 已有插件给出回复，取消后面插件的推测执行
+                self._cancel_speculations(speculations)
+                yield first
+                try:
+                    for chunk in chunks:
+                        if chunk:
+                            yield chunk
+                except Exception as e:
+                    print(f"插件 {plugin_name} 生成回复时出错: {e}")
+                return
+
+            # 没有插件处理
+        finally:
+            self._cancel_speculations(speculations)
+
+    def _speculate(self, user_input, context_manager):
+        """
+        对排在第一个之后、支持推测执行的插件提前在后台开始处理
+
+        Returns:
+            dict: id(插件) -> Speculation
+        """
+        speculations = {}
+        for _, plugin in self.plugins[1:]:
+            if not hasattr(plugin, 'speculate'):
+                continue
+            try:
+                speculation = plugin.speculate(user_input, context_manager)
             except Exception as e:
-                print(f"插件 {getattr(plugin, 'plugin_name', 'unknown')} 执行错误: {e}")
-        
-        # 没有插件处理
-        return None
+                print(f"插件 {getattr(plugin, 'plugin_name', 'unknown')} 推测执行失败: {e}")
+                continue
+            if speculation is not None:
+                speculations[id(plugin)] = speculation
+        return speculations
+
+    @staticmethod
+    def _cancel_speculations(speculations):
+        """
+        取消尚未采用的推测执行
+        """
+        for speculation in speculations.values():
+            speculation.cancel()
+        speculations.clear()
+
+    @staticmethod
+    def _iter_chunks(response):
+        """
+        将插件返回的生成器或异步迭代器统一为同步迭代
+        """
+        if not hasattr(response, '__aiter__'):
+            yield from response
+            return
+
+        # 异步迭代器：在私有事件循环中逐个取出片段
+        loop = asyncio.new_event_loop()
+        iterator = response.__aiter__()
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(iterator.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            if hasattr(iterator, 'aclose'):
+                loop.run_until_complete(iterator.aclose())
+            loop.close()
     
+    def notify_wake(self):
+        """
+        通知所有插件检测到唤醒词，插件可借此预热资源
+        """
+        for _, plugin in self.plugins:
+            if hasattr(plugin, 'on_wake'):
+                try:
+                    plugin.on_wake()
+                except Exception as e:
+                    print(f"插件 {getattr(plugin, 'plugin_name', 'unknown')} 预热失败: {e}")
+
+    def cancel(self):
+        """
+        通知所有插件取消正在进行的处理（用户打断时调用）
+        """
+        for _, plugin in self.plugins:
+            if hasattr(plugin, 'cancel'):
+                try:
+                    plugin.cancel()
+                except Exception as e:
+                    print(f"插件 {getattr(plugin, 'plugin_name', 'unknown')} 取消失败: {e}")
+
     def reload_plugins(self):
         """
         重新加载所有插件
@@ -121,6 +243,21 @@ class PluginManager:
         self._load_plugins()
         print(f"重新加载完成，当前加载了 {len(self.plugins)} 个插件")
     
+    def get_plugin_stats(self):
+        """
+        获取各插件的运行统计
+
+        Returns:
+            dict: 插件名称 -> 统计信息，只包含提供了统计的插件
+        """
+        stats = {}
+        for _, plugin in self.plugins:
+            if hasattr(plugin, 'get_stats'):
+                plugin_stats = plugin.get_stats()
+                if plugin_stats is not None:
+                    stats[getattr(plugin, 'plugin_name', 'unknown')] = plugin_stats
+        return stats
+
     def get_plugin_info(self):
         """
         获取所有已加载插件的信息
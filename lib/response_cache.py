@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+大模型回复缓存：内存LRU + 可选的SQLite持久层，按归一化后的问题、模型和提示词模板寻址
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# 归一化时去掉的标点和空白（含全角标点）
+_PUNCTUATION = re.compile(r"[\s　-〿＀-／：-＠［-｀｛-･!-/:-@\[-`{-~]+")
+
+
+def normalize_text(text):
+    """
+    归一化用户输入：全角转半角、转小写、去掉标点和空白，
+    使“讲个笑话。”和“讲个笑话”命中同一条缓存
+    """
+    text = unicodedata.normalize('NFKC', text or "").lower()
+    return _PUNCTUATION.sub("", text)
+
+
+class ResponseCache:
+    """大模型回复缓存，超过有效期的条目视为未命中，超出容量时按LRU淘汰"""
+
+    def __init__(self, max_entries=256, ttl=24 * 3600, db_path=None, db_max_entries=2048):
+        """
+        初始化回复缓存
+
+        Args:
+            max_entries: 内存中最多缓存的条目数
+            ttl: 有效期（秒），None表示永不过期
+            db_path: SQLite数据库路径，None表示不持久化
+            db_max_entries: 数据库中最多保留的条目数
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_max_entries = db_max_entries
+        self._memory = OrderedDict()  # key -> (回复, 写入时间)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+        self._db = None
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                    "created_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+                self._db.commit()
+                self._purge_expired()
+            except sqlite3.Error as e:
+                print(f"打开回复缓存数据库失败，仅使用内存缓存: {e}")
+                self._db = None
+
+    @staticmethod
+    def make_key(text, model, template=""):
+        """根据归一化后的问题、模型名称和提示词模板生成缓存键"""
+        template_hash = hashlib.sha256(template.encode('utf-8')).hexdigest()
+        raw = "\x1f".join([normalize_text(text), model, template_hash])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _is_expired(self, created_at, now):
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def get(self, key):
+        """读取缓存，未命中或已过期返回None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                response, created_at = entry
+                if not self._is_expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return response
+                del self._memory[key]
+                self.expired += 1
+
+            row = self._db_get(key, now)
+            if row is None:
+                self.misses += 1
+                return None
+            response, created_at = row
+            self.hits += 1
+            self._put_memory(key, response, created_at)
+            return response
+
+    def put(self, key, response):
+        """写入缓存"""
+        if not response:
+            return
+        now = time.time()
+        with self._lock:
+            self._put_memory(key, response, now)
+            self._db_put(key, response, now)
+
+    def _put_memory(self, key, response, created_at):
+        """写入内存缓存，调用方需持有锁"""
+        self._memory.pop(key, None)
+        self._memory[key] = (response, created_at)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _db_get(self, key, now):
+        """从数据库读取，调用方需持有锁"""
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self._is_expired(row[1], now):
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                self.expired += 1
+                return None
+            self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            return row
+        except sqlite3.Error as e:
+            print(f"读取回复缓存失败: {e}")
+            return None
+
+    def _db_put(self, key, response, now):
+        """写入数据库并按最近访问时间淘汰多余条目，调用方需持有锁"""
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)", (key, response, now, now))
+            self._db.execute(
+                "DELETE FROM responses WHERE key NOT IN ("
+                "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT ?)", (self.db_max_entries,))
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"写入回复缓存失败: {e}")
+
+    def _purge_expired(self):
+        """启动时清理数据库中已过期的条目"""
+        if self._db is None or self.ttl is None:
+            return
+        self._db.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+        self._db.commit()
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM responses")
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"清空回复缓存失败: {e}")
+
+    def get_stats(self):
+        with self._lock:
+            stats = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'memory_entries': len(self._memory),
+            }
+            if self._db is not None:
+                try:
+                    stats['disk_entries'] = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+                except sqlite3.Error:
+                    pass
+        return stats
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+语义缓存：按问题的向量相似度查找已回答过的问题，换个说法问同一件事也能直接作答
+"""
+
+import threading
+import time
+import numpy as np
+
+
+class SemanticCache:
+    """
+    向量存放在连续的float32矩阵中（每行一条，已归一化），查找时一次矩阵乘法得到所有余弦相似度；
+    超过有效期的条目视为失效，容量由内存上限决定，满时淘汰最久未命中的条目
+    """
+
+    def __init__(self, threshold=0.9, ttl=24 * 3600, max_bytes=4 * 1024 * 1024, top_k=3):
+        """
+        初始化语义缓存
+
+        Args:
+            threshold: 余弦相似度阈值，达到阈值才算命中
+            ttl: 有效期（秒），None表示永不过期
+            max_bytes: 向量矩阵占用的内存上限（字节），条目数在首次写入、得知向量维度后确定
+            top_k: 查找时取相似度最高的条目数
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.top_k = top_k
+        self.capacity = 0
+        self.vectors = None  # (capacity, dim) float32
+        self.created_at = None  # 写入时间
+        self.last_used = None  # 最近命中时间，用于淘汰
+        self.valid = None  # 槽位是否有效
+        self.entries = []  # 槽位 -> (问题, 回复)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _allocate(self, dim):
+        """按向量维度分配矩阵，调用方需持有锁"""
+        self.capacity = max(1, self.max_bytes // (dim * 4))
+        self.vectors = np.zeros((self.capacity, dim), dtype=np.float32)
+        self.created_at = np.zeros(self.capacity, dtype=np.float64)
+        self.last_used = np.zeros(self.capacity, dtype=np.float64)
+        self.valid = np.zeros(self.capacity, dtype=bool)
+        self.entries = [None] * self.capacity
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def _expire(self, now):
+        """标记过期条目，调用方需持有锁"""
+        if self.ttl is not None:
+            self.valid &= (now - self.created_at) <= self.ttl
+
+    def search(self, vector):
+        """
+        查找与给定向量最相似的条目
+
+        Returns:
+            list: [(相似度, 问题, 回复), ...]，按相似度从高到低，只包含达到阈值的条目
+        """
+        query = self._normalize(vector)
+        now = time.time()
+        with self._lock:
+            if query is None or self.vectors is None or query.shape[0] != self.vectors.shape[1]:
+                self.misses += 1
+                return []
+            self._expire(now)
+            scores = self.vectors @ query
+            scores[~self.valid] = -1.0
+            k = min(self.top_k, self.capacity)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            results = [(float(scores[i]), *self.entries[i]) for i in top if scores[i] >= self.threshold]
+            if results:
+                self.hits += 1
+                self.last_used[top[0]] = now
+            else:
+                self.misses += 1
+            return results
+
+    def get(self, vector):
+        """
+        读取最相似条目的回复，未命中返回None
+        """
+        results = self.search(vector)
+        return results[0][2] if results else None
+
+    def put(self, vector, question, response):
+        """写入缓存，容量已满时覆盖最久未命中的条目"""
+        vector = self._normalize(vector)
+        if vector is None or not response:
+            return
+        now = time.time()
+        with self._lock:
+            if self.vectors is None:
+                self._allocate(vector.shape[0])
+            elif vector.shape[0] != self.vectors.shape[1]:
+                # 换了向量模型，旧向量不再可比
+                self._allocate(vector.shape[0])
+            self._expire(now)
+            free = np.flatnonzero(~self.valid)
+            slot = free[0] if len(free) else int(np.argmin(self.last_used))
+            self.vectors[slot] = vector
+            self.created_at[slot] = now
+            self.last_used[slot] = now
+            self.valid[slot] = True
+            self.entries[slot] = (question, response)
+
+    def clear(self):
+        with self._lock:
+            if self.valid is not None:
+                self.valid[:] = False
+                self.entries = [None] * self.capacity
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': int(self.valid.sum()) if self.valid is not None else 0,
+                'capacity': self.capacity,
+            }
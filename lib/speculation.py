@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+推测执行：识别出文本后立即在后台启动耗时插件（如大模型），与前面的规则插件并行；
+被采用时直接读取已缓冲的片段，被更高优先级的插件抢先回答时取消
+"""
+
+import queue
+import threading
+
+from lib.context_manager import Context
+
+_DONE = object()
+
+
+class DeferredContextManager:
+    """
+    上下文管理器代理：读操作直接转给真实的上下文管理器，
+    add_context先记录下来，推测结果被采用时再写入，被取消时丢弃
+    """
+
+    def __init__(self, context_manager, cancel_event=None):
+        self._context_manager = context_manager
+        self._added = []
+        self._callbacks = []  # 采用后才执行的副作用
+        self._committed = False
+        self._cancel_event = cancel_event or threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        """推测执行是否已被取消，插件可在耗时步骤之间检查并提前结束"""
+        return self._cancel_event.is_set()
+
+    def add_context(self, user_input, system_response=None):
+        with self._lock:
+            if self._committed:
+                return self._context_manager.add_context(user_input, system_response)
+            context = Context(user_input, system_response)
+            self._added.append(context)
+            return context
+
+    def on_commit(self, callback):
+        """
+        登记采用后才执行的副作用（如更新插件状态、写入缓存），已采用时立即执行，被取消时丢弃
+        """
+        with self._lock:
+            if not self._committed:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def commit(self):
+        """
+        把记录下的上下文写入真实的上下文管理器并执行登记的副作用，之后的add_context和on_commit直接执行
+        """
+        with self._lock:
+            self._committed = True
+            for context in self._added:
+                self._context_manager.append_context(context)
+            self._added = []
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def __getattr__(self, name):
+        return getattr(self._context_manager, name)
+
+
+class Speculation:
+    """
+    一次推测执行：后台线程调用插件的handle并把回复片段缓冲到队列中
+    """
+
+    def __init__(self, handler, user_input, context_manager, on_cancel=None):
+        """
+        启动推测执行
+
+        Args:
+            handler: 插件的处理方法，签名同handle
+            user_input: 用户输入的文本
+            context_manager: 上下文管理器实例
+            on_cancel: 取消时的回调，用于中断进行中的请求（如关闭HTTP流）
+        """
+        self.on_cancel = on_cancel
+        self.cancelled = threading.Event()
+        self.context = DeferredContextManager(context_manager, cancel_event=self.cancelled)
+        self._chunks = queue.Queue()
+        self.thread = threading.Thread(target=self._run, args=(handler, user_input),
+                                       name="speculation", daemon=True)
+        self.thread.start()
+
+    def _run(self, handler, user_input):
+        try:
+            response = handler(user_input, self.context)
+            if not response or self.cancelled.is_set():
+                return
+            if isinstance(response, str):
+                self._chunks.put(response)
+                return
+            try:
+                for chunk in response:
+                    if self.cancelled.is_set():
+                        break
+                    self._chunks.put(chunk)
+            finally:
+                if hasattr(response, 'close'):
+                    response.close()
+        except Exception as e:
+            if not self.cancelled.is_set():
+                self._chunks.put(e)
+        finally:
+            self._chunks.put(_DONE)
+
+    def result(self):
+        """
+        采用推测结果：写入上下文并返回回复片段的生成器（先产出已缓冲的片段，再跟随后续生成）
+        """
+        self.context.commit()
+        return self._iter_chunks()
+
+    def _iter_chunks(self):
+        finished = False
+        try:
+            while True:
+                chunk = self._chunks.get()
+                if chunk is _DONE:
+                    finished = True
+                    return
+                if isinstance(chunk, Exception):
+                    finished = True
+                    raise chunk
+                yield chunk
+        finally:
+            # 消费方中途放弃（如用户打断）时停止后台生成
+            if not finished:
+                self.cancel()
+
+    def cancel(self):
+        """
+        取消推测执行，丢弃已缓冲的片段和记录的上下文
+        """
+        if self.cancelled.is_set():
+            return
+        self.cancelled.set()
+        if self.on_cancel is not None:
+            try:
+                self.on_cancel()
+            except Exception as e:
+                print(f"取消推测执行失败: {e}")
@@ -3,12 +3,214 @@ import time
 import wave
 import vosk
 import json
+import queue
+import threading
+import collections
 import pyaudio
 import numpy as np
 import speech_recognition as sr
 import config.config
 
 
+class VoskModelRegistry:
+    """进程级Vosk模型缓存，按模型路径加载一次，并复用KaldiRecognizer"""
+
+    _lock = threading.Lock()
+    _entries = {}
+
+    def __init__(self, model_path, pool_size=2):
+        self.model_path = model_path
+        self.pool_size = pool_size
+        self.model = None
+        self.error = None
+        self.ready = threading.Event()  # 模型加载完成（或失败）的就绪信号
+        self._pools = {}  # 采样率 -> 可复用识别器队列
+        self._load_lock = threading.Lock()
+        self._pool_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, model_path=config.config.VOSK_MODEL):
+        """获取模型路径对应的共享实例（不触发加载）"""
+        with cls._lock:
+            entry = cls._entries.get(model_path)
+            if entry is None:
+                entry = cls(model_path, pool_size=config.config.VOSK_RECOGNIZER_POOL_SIZE)
+                cls._entries[model_path] = entry
+            return entry
+
+    @classmethod
+    def preload(cls, model_path=config.config.VOSK_MODEL, background=True):
+        """预加载模型，background为True时在后台线程中加载"""
+        entry = cls.get(model_path)
+        if background:
+            threading.Thread(target=entry.load, name="vosk-preload", daemon=True).start()
+        else:
+            entry.load()
+        return entry
+
+    def load(self):
+        """加载模型，重复调用只会加载一次"""
+        with self._load_lock:
+            if self.ready.is_set():
+                return self.model
+            try:
+                start = time.time()
+                self.model = vosk.Model(self.model_path)
+                print(f"✅ Vosk模型加载完成: {self.model_path}，耗时{time.time() - start:.1f}秒")
+            except Exception as e:
+                self.error = e
+                print(f"❌ Vosk模型加载失败: {e}")
+            finally:
+                self.ready.set()
+        return self.model
+
+    def is_ready(self):
+        """模型是否已可用"""
+        return self.ready.is_set() and self.model is not None
+
+    def wait_ready(self, timeout=None):
+        """等待模型加载完成，返回模型是否可用"""
+        self.ready.wait(timeout)
+        return self.is_ready()
+
+    def acquire_recognizer(self, rate=16000):
+        """从池中取出一个识别器，池为空时新建"""
+        if self.load() is None:
+            raise RuntimeError(f"Vosk模型不可用: {self.error}")
+        with self._pool_lock:
+            pool = self._pools.setdefault(rate, queue.Queue(maxsize=self.pool_size))
+        try:
+            return pool.get_nowait()
+        except queue.Empty:
+            return vosk.KaldiRecognizer(self.model, rate)
+
+    def release_recognizer(self, recognizer, rate=16000):
+        """重置识别器并归还到池中，池满时直接丢弃"""
+        recognizer.Reset()
+        try:
+            self._pools[rate].put_nowait(recognizer)
+        except (KeyError, queue.Full):
+            pass
+
+
+class StreamingRecognizer:
+    """边录边识别：录音时逐块送入KaldiRecognizer，录音结束即可拿到识别结果"""
+
+    def __init__(self, rate=16000, model_path=config.config.VOSK_MODEL):
+        self.rate = rate
+        self.registry = VoskModelRegistry.get(model_path)
+        self.recognizer = self.registry.acquire_recognizer(rate)
+        self.results = []  # 已确定的分句结果
+        self.partial = ""  # 当前句子的中间结果
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="vosk-stream", daemon=True)
+        self._worker.start()
+
+    def _run(self):
+        """后台解码线程，避免识别耗时阻塞录音读取"""
+        while True:
+            data = self._queue.get()
+            if data is None:
+                break
+            try:
+                if self.recognizer.AcceptWaveform(data):
+                    text = json.loads(self.recognizer.Result()).get('text', '')
+                    if text:
+                        self.results.append(text)
+                    self.partial = ""
+                else:
+                    self.partial = json.loads(self.recognizer.PartialResult()).get('partial', '')
+            except Exception as e:
+                print(f"流式识别错误: {e}")
+
+    def accept(self, data):
+        """送入一段音频数据（非阻塞）"""
+        self._queue.put(data)
+
+    def finish(self):
+        """等待剩余音频解码完成，返回完整识别文本并归还识别器"""
+        if self.recognizer is None:
+            return ' '.join(self.results)
+        self._queue.put(None)
+        self._worker.join()
+        try:
+            final_result = json.loads(self.recognizer.FinalResult())
+            if final_result.get('text'):
+                self.results.append(final_result['text'])
+        finally:
+            self.registry.release_recognizer(self.recognizer, self.rate)
+            self.recognizer = None
+        self.partial = ""
+        return ' '.join(self.results)
+
+
+class Utterance:
+    """一次语音指令的音频，PCM数据保存在单块连续内存中，可直接交给识别器"""
+
+    def __init__(self, rate=16000, sample_width=2, channels=1):
+        self.rate = rate
+        self.sample_width = sample_width
+        self.channels = channels
+        self.buffer = bytearray()
+
+    def append(self, data):
+        """追加一段PCM数据"""
+        self.buffer += data
+
+    @property
+    def pcm(self):
+        """PCM数据的只读视图（不复制）"""
+        return memoryview(self.buffer).toreadonly()
+
+    def as_numpy(self):
+        """以int16数组形式返回PCM数据（不复制）"""
+        return np.frombuffer(self.buffer, dtype=np.int16)
+
+    @property
+    def duration(self):
+        """音频时长（秒）"""
+        return len(self.buffer) / (self.rate * self.sample_width * self.channels)
+
+    def is_empty(self):
+        return len(self.buffer) == 0
+
+    def save(self, filename):
+        """保存为WAV文件，仅用于调试"""
+        with wave.open(filename, 'wb') as wf:
+            wf.setnchannels(self.channels)
+            wf.setsampwidth(self.sample_width)
+            wf.setframerate(self.rate)
+            wf.writeframes(self.buffer)
+        return filename
+
+
+class Endpointer:
+    """结合能量VAD与Vosk中间/最终结果的自适应断句：句子完整时短等待，说到一半时长等待"""
+
+    # 听起来像一句话已经说完的结尾字（Vosk的识别结果不含标点，“的”多出现在句中，都不列入）
+    COMPLETE_ENDINGS = ("吗", "呢", "吧", "了", "啊", "呀", "么")
+
+    def __init__(self, short_hangover=0.5, long_hangover=1.2):
+        self.short_hangover = short_hangover
+        self.long_hangover = long_hangover
+
+    def is_complete(self, text):
+        """判断文本是否像一句完整的话"""
+        text = text.replace(' ', '')
+        return bool(text) and text.endswith(self.COMPLETE_ENDINGS)
+
+    def hangover(self, recognizer):
+        """根据识别器当前状态返回需要等待的尾部静音时长（秒）"""
+        partial = recognizer.partial.strip()
+        if partial:
+            # 识别器仍在等待当前句子结束
+            return self.short_hangover if self.is_complete(partial) else self.long_hangover
+        if recognizer.results:
+            # Vosk已给出最终结果，且之后没有新的语音
+            return self.short_hangover
+        return self.long_hangover
+
+
 class AdvancedVAD:
     def __init__(self, rate=16000, chunk=1024):
         self.rate = rate
@@ -18,6 +220,10 @@ class AdvancedVAD:
         # VAD参数
         self.energy_threshold = 300  # 能量阈值
         self.silence_limit = 3  # 静音限制（秒）
+        self.endpointer = Endpointer(
+            short_hangover=config.config.ENDPOINT_SHORT_HANGOVER,
+            long_hangover=config.config.ENDPOINT_LONG_HANGOVER,
+        )
         self.previous_energy = 0
         self.energy_delta = 100  # 能量变化阈值
 
@@ -44,49 +250,81 @@ class AdvancedVAD:
 
         return is_above_threshold or has_energy_change
 
-    def record_until_silence(self, callback=None, max_duration=10):
-        """录制直到检测到3秒静音"""
+    def record_until_silence(self, callback=None, max_duration=10, recognizer=None, source=None, preroll=0.0):
+        """
+        录制直到检测到静音，返回Utterance；传入recognizer时边录边识别并自适应断句，
+        传入source（共享采集的RingCursor）时从环形缓冲区读取，否则单独打开PyAudio录音流；
+        preroll（秒）为检测到语音开始时向前补录的时长，避免丢失能量较低的第一个字，
+        补录的音频不参与语音检测，也不会提前开始静音计时
+        """
         self.is_recording = True
         self.recording_started = False
 
-        audio_buffer = []
+        utterance = Utterance(rate=self.rate)
         silence_frames = 0
         speech_frames = 0
-
-        stream = self.audio.open(
-            format=pyaudio.paInt16,
-            channels=1,
-            rate=self.rate,
-            input=True,
-            frames_per_buffer=self.chunk
-        )
+        # 语音开始前最近的若干块音频
+        lookback = collections.deque(maxlen=int(np.ceil(preroll * self.rate / self.chunk)) or None)
+
+        stream = None
+        if source is None:
+            stream = self.audio.open(
+                format=pyaudio.paInt16,
+                channels=1,
+                rate=self.rate,
+                input=True,
+                frames_per_buffer=self.chunk
+            )
 
         print("🎤 等待语音开始...")
 
         try:
             while self.is_recording:
-                data = stream.read(self.chunk, exception_on_overflow=False)
+                if source is not None:
+                    data = source.read_bytes(self.chunk)
+                    if data is None:
+                        print("音频采集已停止")
+                        break
+                else:
+                    data = stream.read(self.chunk, exception_on_overflow=False)
 
                 if self.is_speech(data):
                     if not self.recording_started:
                         print("🗣️ 检测到语音，开始录制...")
                         self.recording_started = True
-
-                    audio_buffer.append(data)
+                        for block in lookback:
+                            utterance.append(block)
+                            if recognizer is not None:
+                                recognizer.accept(block)
+                        lookback.clear()
+
+                    utterance.append(data)
+                    if recognizer is not None:
+                        recognizer.accept(data)
                     silence_frames = 0
                     speech_frames += 1
 
                 else:
                     if self.recording_started:
                         silence_frames += 1
-                        audio_buffer.append(data)  # 仍然保存静音帧
+                        utterance.append(data)  # 仍然保存静音帧
+                        if recognizer is not None:
+                            recognizer.accept(data)
+                    elif preroll > 0:
+                        lookback.append(data)
 
                 # 检查停止条件
                 silence_seconds = silence_frames * self.chunk / self.rate
-                total_seconds = len(audio_buffer) * self.chunk / self.rate
+                total_seconds = utterance.duration
+
+                # 自适应断句模式下由识别结果决定等待时长，否则使用固定的静音限制
+                if recognizer is not None and config.config.ENDPOINT_MODE == "adaptive":
+                    silence_limit = self.endpointer.hangover(recognizer)
+                else:
+                    silence_limit = self.silence_limit
 
-                # 如果已经开始录制且检测到3秒静音，停止
-                if self.recording_started and silence_seconds >= self.silence_limit:
+                # 如果已经开始录制且检测到足够长的静音，停止
+                if self.recording_started and silence_seconds >= silence_limit:
                     print(f"检测到{silence_seconds:.1f}秒静音，停止录制")
                     break
 
@@ -99,30 +337,23 @@ class AdvancedVAD:
             print(f"录制错误: {e}")
 
         finally:
-            stream.stop_stream()
-            stream.close()
-
-            filename = os.path.join(config.config.TTS_TO_SPEECH_TMP_DIR, f"command_{int(time.time())}.wav")
-            if audio_buffer and self.recording_started:
-                self.save_audio(audio_buffer, filename)
-                print(f"✅ 录制完成: {filename}")
+            if stream is not None:
+                stream.stop_stream()
+                stream.close()
+
+            if not utterance.is_empty() and self.recording_started:
+                print(f"✅ 录制完成: {utterance.duration:.1f}秒")
+                # 仅在调试模式下落盘
+                if config.config.DEBUG_SAVE_AUDIO:
+                    filename = os.path.join(config.config.TTS_TO_SPEECH_TMP_DIR, f"command_{time.time_ns()}.wav")
+                    utterance.save(filename)
+                    print(f"音频已保存: {filename}")
 
                 if callback:
-                    callback(filename)
+                    callback(utterance)
             else:
                 print("❌ 没有检测到有效语音")
-            return filename
-
-    def save_audio(self, frames, filename):
-        """保存音频文件"""
-        import wave
-
-        wf = wave.open(filename, 'wb')
-        wf.setnchannels(1)
-        wf.setsampwidth(self.audio.get_sample_size(pyaudio.paInt16))
-        wf.setframerate(self.rate)
-        wf.writeframes(b''.join(frames))
-        wf.close()
+            return utterance
 
 
 class SpeechToText:
@@ -130,13 +361,16 @@ class SpeechToText:
 
     @staticmethod
     def speech_to_text(audio_file):
-        """使用SpeechRecognition进行语音识别"""
+        """使用SpeechRecognition进行语音识别，支持Utterance或音频文件路径"""
         try:
             r = sr.Recognizer()
-            with sr.AudioFile(audio_file) as source:
-                # 调整环境噪声
-                r.adjust_for_ambient_noise(source, duration=0.5)
-                audio = r.record(source)
+            if isinstance(audio_file, Utterance):
+                audio = sr.AudioData(bytes(audio_file.buffer), audio_file.rate, audio_file.sample_width)
+            else:
+                with sr.AudioFile(audio_file) as source:
+                    # 调整环境噪声
+                    r.adjust_for_ambient_noise(source, duration=0.5)
+                    audio = r.record(source)
 
             # 使用Google语音识别
             text = r.recognize_google(audio, language='zh-CN')
@@ -150,24 +384,42 @@ class SpeechToText:
             return ""
 
     @staticmethod
-    def speech_to_text_by_vosk(audio_file, model_path=config.config.VOSK_MODEL):
-        """使用Vosk离线识别"""
-        model = vosk.Model(model_path)
-        wf = wave.open(audio_file, "rb")
-
-        recognizer = vosk.KaldiRecognizer(model, wf.getframerate())
+    def preload(model_path=config.config.VOSK_MODEL, background=True):
+        """预热Vosk模型，避免首次唤醒时才加载"""
+        return VoskModelRegistry.preload(model_path, background=background)
 
-        results = []
-        while True:
-            data = wf.readframes(4000)
-            if len(data) == 0:
-                break
-            if recognizer.AcceptWaveform(data):
-                result = json.loads(recognizer.Result())
-                results.append(result.get('text', ''))
+    @staticmethod
+    def is_ready(model_path=config.config.VOSK_MODEL):
+        """Vosk模型是否已加载完成"""
+        return VoskModelRegistry.get(model_path).is_ready()
 
-        final_result = json.loads(recognizer.FinalResult())
-        results.append(final_result.get('text', ''))
+    @staticmethod
+    def speech_to_text_by_vosk(audio_file, model_path=config.config.VOSK_MODEL):
+        """使用Vosk离线识别，支持Utterance或音频文件路径"""
+        registry = VoskModelRegistry.get(model_path)
+        if isinstance(audio_file, Utterance):
+            rate = audio_file.rate
+            pcm = audio_file.pcm
+            step = 4000 * audio_file.sample_width
+        else:
+            with wave.open(audio_file, "rb") as wf:
+                rate = wf.getframerate()
+                pcm = memoryview(wf.readframes(wf.getnframes()))
+                step = 4000 * wf.getsampwidth()
+        chunks = (bytes(pcm[i:i + step]) for i in range(0, len(pcm), step))
+
+        recognizer = registry.acquire_recognizer(rate)
+        try:
+            results = []
+            for data in chunks:
+                if recognizer.AcceptWaveform(data):
+                    result = json.loads(recognizer.Result())
+                    results.append(result.get('text', ''))
+
+            final_result = json.loads(recognizer.FinalResult())
+            results.append(final_result.get('text', ''))
+        finally:
+            registry.release_recognizer(recognizer, rate)
 
         return ' '.join(results)
 
@@ -183,9 +435,9 @@ def integrate_with_hotword():
         print("🔥 热词唤醒！")
         vad_system.record_until_silence(callback=process_command)
 
-    def process_command(audio_file):
+    def process_command(utterance):
         """处理指令"""
-        command_text = stt.speech_to_text(audio_file)
+        command_text = stt.speech_to_text(utterance)
         if command_text:
             print(f"🎯 指令: {command_text}")
             # 执行相应操作
@@ -196,7 +448,7 @@ def integrate_with_hotword():
 # if __name__ == "__main__":
 #     vad_system = AdvancedVAD()
 #     stt = SpeechToText()
-#     audio_file = vad_system.record_until_silence()
-#     print("audio_file:", audio_file)
-#     ret = stt.speech_to_text_by_vosk(audio_file)
+#     utterance = vad_system.record_until_silence()
+#     print("duration:", utterance.duration)
+#     ret = stt.speech_to_text_by_vosk(utterance)
 #     print("ret:", ret)
\ No newline at end of file
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+对话摘要：在回复播放完之后于后台把较早的对话压缩为滚动摘要，不占用交互的关键路径
+"""
+
+import threading
+import time
+
+import config.config
+from lib.ollama import OllamaClient
+
+SUMMARY_PROMPT = """请把下面的对话整理成一段简短的摘要，保留用户的偏好、提到的事实和尚未完成的事情，不超过{max_chars}个字，只输出摘要本身。
+
+已有摘要：
+{summary}
+
+新的对话：
+{dialogue}
+"""
+
+
+class Summarizer:
+    """
+    后台摘要器：schedule()只做标记立即返回，工作线程等助手空闲一段时间后取出需要压缩的上下文，
+    连同已有摘要交给大模型生成新的摘要后写回上下文管理器；再次唤醒时postpone()中断并推迟摘要，
+    避免摘要请求占用模型、拖慢紧接着的提问
+    """
+
+    def __init__(self, context_manager, model=None, keep_recent=None, max_chars=None, is_busy=None):
+        """
+        初始化摘要器
+
+        Args:
+            context_manager: 上下文管理器实例
+            model: 生成摘要使用的模型，None表示使用LLM_SUMMARY_MODEL
+            keep_recent: 保留原文的最近轮数
+            max_chars: 摘要的字数上限
+            is_busy: 返回助手是否正在交互的函数，忙碌时不生成摘要
+        """
+        self.context_manager = context_manager
+        self.model = model or config.config.LLM_SUMMARY_MODEL
+        self.keep_recent = config.config.LLM_SUMMARY_KEEP_TURNS if keep_recent is None else keep_recent
+        self.max_chars = max_chars or config.config.LLM_SUMMARY_MAX_CHARS
+        # 独立的客户端，打断当前回复时不会连带取消摘要请求
+        self.client = OllamaClient(
+            hosts=config.config.LLM_HOSTS,
+            timeout=config.config.LLM_REQUEST_TIMEOUT,
+            hedge_delay=config.config.LLM_HEDGE_DELAY,
+            probe_interval=config.config.LLM_PROBE_INTERVAL,
+        )
+        self.is_busy = is_busy
+        self.idle_delay = config.config.LLM_SUMMARY_IDLE_DELAY
+        self.runs = 0
+        self.failures = 0
+        self.postponed = 0
+        self.running = True
+        self._summarizing = False
+        self._last_activity = time.time()
+        self._wakeup = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="summarizer", daemon=True)
+        self.thread.start()
+
+    def schedule(self):
+        """
+        请求在后台更新摘要（不阻塞），助手空闲idle_delay秒后才会执行
+        """
+        self._last_activity = time.time()
+        self._wakeup.set()
+
+    def postpone(self):
+        """
+        助手被唤醒时调用：中断进行中的摘要请求，等下次空闲时重新生成
+        """
+        self._last_activity = time.time()
+        if self._summarizing:
+            self.postponed += 1
+            self._wakeup.set()
+            self.client.cancel()
+
+    def _idle(self):
+        if self.is_busy is not None and self.is_busy():
+            return False
+        return time.time() - self._last_activity >= self.idle_delay
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            if not self.running:
+                break
+            # 等待助手空闲
+            while self.running and not self._idle():
+                time.sleep(0.2)
+            if not self.running:
+                break
+            self._wakeup.clear()
+            self._summarizing = True
+            try:
+                self.summarize()
+            except Exception as e:
+                self.failures += 1
+                print(f"对话摘要失败: {e}")
+            finally:
+                self._summarizing = False
+
+    def summarize(self):
+        """
+        把需要压缩的上下文并入摘要
+
+        Returns:
+            bool: 是否更新了摘要
+        """
+        contexts = self.context_manager.get_aged_contexts(self.keep_recent)
+        if not contexts:
+            return False
+
+        dialogue = "\n".join(f"用户: {ctx.user_input}\n助手: {ctx.system_response}" for ctx in contexts)
+        prompt = SUMMARY_PROMPT.format(
+            max_chars=self.max_chars,
+            summary=self.context_manager.get_summary() or "无",
+            dialogue=dialogue,
+        )
+        # 使用流式请求：postpone()调用cancel()时关闭连接，Ollama随即停止生成，不会继续占用模型
+        stream = self.client.generate_stream(
+            self.model, prompt,
+            temperature=0.2,
+            num_predict=self.max_chars * 2,
+            keep_alive=config.config.LLM_KEEP_ALIVE,
+        )
+        summary = None
+        if stream is not None:
+            try:
+                if not self._wakeup.is_set():
+                    for _ in stream:
+                        pass
+            finally:
+                stream.close()
+            # 中途被关闭时没有最终记录，不采用不完整的摘要
+            if stream.stats is not None:
+                summary = stream.text
+        if not summary:
+            # 被postpone()中断时不计为失败，稍后会重新生成
+            if not self._wakeup.is_set():
+                self.failures += 1
+            return False
+        self.context_manager.commit_summary(summary.strip()[:self.max_chars * 2], contexts)
+        self.runs += 1
+        return True
+
+    def stop(self):
+        """
+        停止后台线程
+        """
+        self.running = False
+        self._wakeup.set()
+        self.client.cancel()
+
+    def get_stats(self):
+        return {
+            'runs': self.runs,
+            'failures': self.failures,
+            'postponed': self.postponed,
+            'summary_chars': len(self.context_manager.get_summary()),
+        }
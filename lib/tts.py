@@ -1,7 +1,18 @@
+import io
+import contextlib
 import os
+import re
 import time
+import queue
+import shutil
+import hashlib
+import itertools
+import threading
+import subprocess
+from collections import OrderedDict, deque
 import edge_tts
 import asyncio
+import numpy as np
 import pygame
 import pyttsx3
 
@@ -23,43 +34,829 @@ import config.config
 "晓悠（女）": "zh-CN-XiaoyouNeural",       # 儿童音
 """
 
-def play_mp3_pygame(file_path):
-    pygame.mixer.init()
-    pygame.mixer.music.load(file_path)
+def _init_mixer():
+    """
+    初始化混音器，只在首次调用时真正初始化
+
+    Returns:
+        bool: 混音器是否可用（没有可用的音频设备时为False）
+    """
+    if not pygame.mixer.get_init():
+        try:
+            pygame.mixer.init()
+        except pygame.error as e:
+            print(f"初始化混音器失败: {e}")
+            return False
+    return True
+
+
+def play_mp3_pygame(source, cancel_event=None):
+    """播放MP3，source可以是文件路径或内存中的MP3数据"""
+    if not _init_mixer():
+        raise RuntimeError("混音器不可用")
+    if isinstance(source, (bytes, bytearray)):
+        # 直接从内存播放，无需写入临时文件
+        pygame.mixer.music.load(io.BytesIO(source), "mp3")
+    else:
+        pygame.mixer.music.load(source)
     pygame.mixer.music.play()
 
-    # 等待播放完成
+    # 等待播放完成，期间可被打断
     while pygame.mixer.music.get_busy():
-        time.sleep(0.1)
+        if cancel_event is not None and cancel_event.wait(0.02):
+            pygame.mixer.music.stop()
+            break
+        if cancel_event is None:
+            time.sleep(0.1)
 
-# 组合使用示例
-def text_to_speech(text, output_file=""):
-    if output_file == "":
-        output_file = os.path.join(config.config.TTS_TO_SPEECH_TMP_DIR, config.config.TTS_TO_SPEECH_FILENAME)
-    try:
-        # 尝试使用 Edge-TTS
-        # raise "failed"
-        asyncio.run(edge_tts.Communicate(
+
+def stop_playback():
+    """立即停止当前播放（用于打断）"""
+    if pygame.mixer.get_init():
+        pygame.mixer.music.stop()
+
+
+class Earcon:
+    """预先解码为PCM的短提示音，在常驻混音器的保留声道上非阻塞播放"""
+
+    def __init__(self, file_path=None, tones=(880, 1320), tone_duration=0.06, volume=0.5):
+        """
+        初始化提示音
+
+        Args:
+            file_path: 提示音文件（WAV/OGG），None表示使用合成的双音提示
+            tones: 合成提示音的频率序列（Hz）
+            tone_duration: 每个音的时长（秒）
+            volume: 音量（0.0-1.0）
+        """
+        if not _init_mixer():
+            raise RuntimeError("混音器不可用，无法播放提示音")
+        pygame.mixer.set_reserved(1)
+        self.channel = pygame.mixer.Channel(0)
+        if file_path:
+            self.sound = pygame.mixer.Sound(file_path)
+        else:
+            self.sound = pygame.mixer.Sound(buffer=self._render(tones, tone_duration, volume))
+        self.duration = self.sound.get_length()
+
+    @staticmethod
+    def _render(tones, tone_duration, volume):
+        """按混音器的采样率和声道数合成提示音PCM"""
+        rate, _, channels = pygame.mixer.get_init()
+        n = int(rate * tone_duration)
+        t = np.arange(n) / rate
+        # 淡入淡出，避免爆音
+        envelope = np.minimum(1.0, np.minimum(t, t[::-1]) / 0.005)
+        wave_data = np.concatenate([np.sin(2 * np.pi * freq * t) * envelope for freq in tones])
+        samples = (wave_data * volume * 32767).astype(np.int16)
+        return np.repeat(samples, channels).tobytes()
+
+    def play(self):
+        """非阻塞播放，返回提示音时长（秒）"""
+        self.channel.play(self.sound)
+        return self.duration
+
+
+# 句子边界：中英文句末标点及换行（英文句点后需跟空白，避免拆开小数），可带结尾引号/括号
+SENTENCE_BOUNDARY = re.compile(r'(?:[。！？；!?;…\n]+|\.(?=\s))[”’」』)）"\']*')
+
+
+def iter_sentences(chunks, min_chars=config.config.TTS_MIN_SENTENCE_CHARS):
+    """
+    将文本块流按句子边界切分，逐句产出；过短的片段与后文合并，避免频繁启停播放
+
+    Args:
+        chunks: 文本块的可迭代对象（完整文本可传入[text]）
+        min_chars: 单句最少字符数
+    """
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        start = 0
+        for match in SENTENCE_BOUNDARY.finditer(buffer):
+            if match.end() == len(buffer) and match.group().endswith('.'):
+                # 末尾的英文句点需要等待下一个字符才能确定是否为句末
+                break
+            if len(buffer[start:match.end()].strip()) >= min_chars:
+                yield buffer[start:match.end()].strip()
+                start = match.end()
+        buffer = buffer[start:]
+    if buffer.strip():
+        yield buffer.strip()
+
+
+def split_sentences(text):
+    """将完整文本切分为句子列表"""
+    return list(iter_sentences([text]))
+
+
+class TTSCache:
+    """语音合成结果的两级缓存（内存+磁盘），按文本和音色参数寻址，超出容量时按LRU淘汰"""
+
+    def __init__(self, cache_dir=config.config.TTS_CACHE_DIR,
+                 memory_bytes=config.config.TTS_CACHE_MEMORY_BYTES,
+                 disk_bytes=config.config.TTS_CACHE_DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()  # key -> 音频数据
+        self._memory_size = 0
+        self._disk = OrderedDict()  # key -> 文件大小
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # 按修改时间恢复磁盘缓存的LRU顺序
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.mp3'):
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                    entries.append((stat.st_mtime, name[:-4], stat.st_size))
+            for _, key, size in sorted(entries):
+                self._disk[key] = size
+                self._disk_size += size
+
+    @staticmethod
+    def make_key(text, voice, rate, pitch, volume):
+        """根据文本和音色参数生成缓存键"""
+        raw = "\x1f".join([text, voice, rate, pitch, volume])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.mp3")
+
+    def get(self, key):
+        """读取缓存，未命中返回None"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return data
+            if key not in self._disk:
+                self.misses += 1
+                return None
+            self._disk.move_to_end(key)
+
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+            os.utime(self._path(key))
+        except OSError:
+            with self._lock:
+                self._disk_size -= self._disk.pop(key, 0)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self._put_memory(key, data)
+        return data
+
+    def put(self, key, data):
+        """写入缓存"""
+        with self._lock:
+            self._put_memory(key, data)
+        if not self.cache_dir or len(data) > self.disk_bytes:
+            return
+        tmp_path = f"{self._path(key)}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"写入语音缓存失败: {e}")
+            return
+        with self._lock:
+            self._disk_size -= self._disk.pop(key, 0)
+            self._disk[key] = len(data)
+            self._disk_size += len(data)
+            while self._disk_size > self.disk_bytes and self._disk:
+                old_key, size = self._disk.popitem(last=False)
+                self._disk_size -= size
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+
+    def _put_memory(self, key, data):
+        """写入内存缓存，调用方需持有锁"""
+        if len(data) > self.memory_bytes:
+            return
+        self._memory_size -= len(self._memory.pop(key, b''))
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes:
+            _, old = self._memory.popitem(last=False)
+            self._memory_size -= len(old)
+
+    def get_stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'memory_bytes': self._memory_size,
+            'disk_bytes': self._disk_size,
+        }
+
+
+class CircuitBreaker:
+    """熔断器：连续失败或响应过慢的次数达到阈值后熔断，由后台探测成功后恢复"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+
+    def __init__(self, failure_threshold=3, slow_threshold=3.0):
+        self.failure_threshold = failure_threshold
+        self.slow_threshold = slow_threshold  # 超过该耗时（秒）的成功响应也计为失败
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        return self.state == self.CLOSED
+
+    def record_success(self, latency):
+        """记录一次成功，返回是否因过慢触发熔断"""
+        if latency > self.slow_threshold:
+            return self.record_failure()
+        with self._lock:
+            self.failures = 0
+            self.state = self.CLOSED
+            self.opened_at = None
+        return False
+
+    def record_failure(self):
+        """记录一次失败，返回是否触发熔断"""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.CLOSED and self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.time()
+                return True
+        return False
+
+
+class LatencyStats:
+    """最近若干次请求的耗时统计"""
+
+    def __init__(self, window=20):
+        self.samples = deque(maxlen=window)
+
+    def add(self, latency):
+        self.samples.append(latency)
+
+    def mean(self):
+        return sum(self.samples) / len(self.samples) if self.samples else None
+
+    def percentile(self, p):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+    def expected(self, min_samples=5):
+        """用于选择后端的预期耗时：样本足够时取p90，否则取均值"""
+        if len(self.samples) >= min_samples:
+            return self.percentile(0.9)
+        return self.mean()
+
+    def keep_latest(self):
+        """只保留最近一次样本（探测恢复后丢弃过时的慢样本）"""
+        if self.samples:
+            latest = self.samples[-1]
+            self.samples.clear()
+            self.samples.append(latest)
+
+
+class TTSBackend:
+    """
+    语音合成后端，带熔断器和耗时统计；熔断或滚动耗时（p90）超过阈值时视为不可用，
+    在后台定期探测，探测成功即恢复
+    """
+
+    def __init__(self, name, probe=None,
+                 failure_threshold=config.config.TTS_BREAKER_FAILURE_THRESHOLD,
+                 slow_threshold=config.config.TTS_BREAKER_SLOW_THRESHOLD,
+                 probe_interval=config.config.TTS_PROBE_INTERVAL):
+        self.name = name
+        self.probe = probe  # 探测函数，失败时抛出异常
+        self.probe_interval = probe_interval
+        self.breaker = CircuitBreaker(failure_threshold, slow_threshold)
+        self.stats = LatencyStats(config.config.TTS_LATENCY_WINDOW)
+        self.failures = 0
+        self._probing = False
+        self._probe_lock = threading.Lock()
+
+    def expected_latency(self):
+        return self.stats.expected()
+
+    def degraded(self):
+        """滚动耗时是否超过阈值（偶发的慢请求不会触发熔断，但持续偏慢时应切换后端）"""
+        latency = self.expected_latency()
+        return latency is not None and latency > self.breaker.slow_threshold
+
+    def available(self):
+        return self.breaker.allow() and not self.degraded()
+
+    def record_success(self, latency):
+        self.stats.add(latency)
+        if self.breaker.record_success(latency):
+            print(f"语音合成后端 {self.name} 响应过慢（{latency:.1f}秒），已熔断")
+            self._start_probe()
+        elif self.degraded():
+            self._start_probe()
+
+    def record_failure(self):
+        self.failures += 1
+        if self.breaker.record_failure():
+            print(f"语音合成后端 {self.name} 连续失败，已熔断")
+            self._start_probe()
+
+    def _start_probe(self):
+        if self.probe is None:
+            return
+        with self._probe_lock:
+            if self._probing:
+                return
+            self._probing = True
+        threading.Thread(target=self._probe_loop, name=f"tts-probe-{self.name}", daemon=True).start()
+
+    def _probe_loop(self):
+        try:
+            while not self.available():
+                time.sleep(self.probe_interval)
+                try:
+                    self.probe()
+                except Exception as e:
+                    print(f"语音合成后端 {self.name} 探测失败: {e}")
+                    continue
+                if self.degraded():
+                    # 探测成功后以最新耗时为准，避免过时的慢样本让后端一直不可用
+                    self.stats.keep_latest()
+            print(f"语音合成后端 {self.name} 已恢复")
+        finally:
+            with self._probe_lock:
+                self._probing = False
+
+    def get_stats(self):
+        mean = self.stats.mean()
+        p90 = self.stats.percentile(0.9)
+        return {
+            'state': self.breaker.state,
+            'degraded': self.degraded(),
+            'failures': self.failures,
+            'latency_mean': round(mean, 3) if mean is not None else None,
+            'latency_p90': round(p90, 3) if p90 is not None else None,
+        }
+
+
+class TTSBackendRegistry:
+    """
+    语音合成后端注册表，按注册顺序选择第一个可用（未熔断且滚动耗时正常）的后端；
+    都不可用时在未熔断的后端和兜底后端中选择预期耗时最低的
+    """
+
+    def __init__(self):
+        self.backends = OrderedDict()
+
+    def register(self, backend):
+        self.backends[backend.name] = backend
+        return backend
+
+    def get(self, name):
+        return self.backends[name]
+
+    def select(self):
+        backends = list(self.backends.values())
+        for backend in backends[:-1]:
+            if backend.available():
+                return backend
+        # 没有状态良好的后端：比较预期耗时，没有样本的后端先试用一次
+        candidates = [backend for backend in backends[:-1] if backend.breaker.allow()] + [backends[-1]]
+        return min(candidates, key=lambda backend: backend.expected_latency() or 0)
+
+    def get_stats(self):
+        return {name: backend.get_stats() for name, backend in self.backends.items()}
+
+
+class TextToSpeech:
+    """语音合成服务：持有常驻事件循环线程、已初始化的混音器和缓存的离线引擎"""
+
+    def __init__(self, voice=config.config.TTS_ENGINE_ROLE_DEFAULT, rate="+2%", pitch="+10Hz", volume="+20%",
+                 cache=None):
+        self.voice = voice  # 音色
+        self.rate = rate  # 语速
+        self.pitch = pitch  # 音调
+        self.volume = volume  # 音量
+        self.cache = cache if cache is not None else TTSCache()
+
+        # 常驻事件循环，所有在线合成任务都提交到这个循环中执行
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="tts-loop", daemon=True)
+        self.thread.start()
+
+        self._offline_engine = None
+        self._offline_lock = threading.Lock()
+        self._player = None  # 流式播放器进程
+        self._wake_word_playing = 0  # 正在播放的含唤醒词语句数
+        self._wake_word_until = 0  # 含唤醒词的语句播放结束后继续屏蔽唤醒的截止时间
+        self._wake_word_lock = threading.Lock()
+        # 混音器不可用时（如没有SDL音频设备）所有语句都交给离线引擎播放
+        self.mixer_ready = _init_mixer()
+        if not self.mixer_ready:
+            print("混音器不可用，使用离线语音引擎播放")
+
+        # 在线合成优先，熔断后直接使用离线引擎
+        self.backends = TTSBackendRegistry()
+        self.online = self.backends.register(TTSBackend("edge", probe=self._probe_online))
+        # 离线引擎是最后的兜底，不因耗时熔断，只记录开始发声前的耗时供选择后端时比较
+        self.offline = self.backends.register(TTSBackend("offline", slow_threshold=float('inf')))
+        self._offline_started = None
+
+    def submit(self, coro):
+        """提交协程到常驻事件循环，返回concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def cache_key(self, text):
+        return TTSCache.make_key(text, self.voice, self.rate, self.pitch, self.volume)
+
+    def _communicate(self, text):
+        return edge_tts.Communicate(
             text=text,
-            voice=config.config.TTS_ENGINE_ROLE_DEFAULT,  # 音色
-            rate="+2%",  # 语速
-            pitch="+10Hz",  # 音调
-            volume="+20%"  # 音量
-        ).save(output_file))
-        if os.path.exists(output_file):
-            play_mp3_pygame(output_file)
+            voice=self.voice,
+            rate=self.rate,
+            pitch=self.pitch,
+            volume=self.volume,
+        )
+
+    async def _edge_chunks(self, text):
+        """Edge-TTS音频块的异步生成器，记录首包耗时，失败或首包超时计入熔断统计"""
+        start = time.time()
+        stream = self._communicate(text).stream()
+        first = True
+        try:
+            while True:
+                try:
+                    timeout = config.config.TTS_ONLINE_TIMEOUT if first else None
+                    chunk = await asyncio.wait_for(stream.__anext__(), timeout)
+                except StopAsyncIteration:
+                    break
+                if chunk["type"] == "audio":
+                    if first:
+                        first = False
+                        self.online.record_success(time.time() - start)
+                    yield chunk["data"]
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            if first:
+                self.online.record_failure()
+            raise
+
+    async def _synthesize_async(self, text):
+        """在事件循环中合成语音，返回MP3数据并写入缓存"""
+        data = bytearray()
+        async for chunk in self._edge_chunks(text):
+            data += chunk
+        data = bytes(data)
+        self.cache.put(self.cache_key(text), data)
+        return data
+
+    def synthesize(self, text):
+        """使用Edge-TTS合成语音，优先读取缓存，返回MP3数据"""
+        data = self.cache.get(self.cache_key(text))
+        if data is not None:
+            return data
+        return self.submit(self._synthesize_async(text)).result()
+
+    def prewarm(self, phrases):
+        """在后台预先合成常用语句，不阻塞调用方"""
+        def report(future, text):
+            if future.exception() is not None:
+                print(f"预合成语音失败: {text}, {future.exception()}")
+
+        for text in phrases:
+            if self.cache.get(self.cache_key(text)) is None:
+                future = self.submit(self._synthesize_async(text))
+                future.add_done_callback(lambda f, text=text: report(f, text))
+
+    def stream_audio(self, text):
+        """
+        流式合成：在事件循环中接收Edge-TTS音频块，调用方线程按到达顺序逐块取出，
+        全部接收完成后写入缓存；调用方提前关闭生成器时取消合成，不再继续下载
+        """
+        chunks = queue.Queue()
+
+        async def produce():
+            try:
+                async for chunk in self._edge_chunks(text):
+                    chunks.put(chunk)
+            except Exception as e:
+                chunks.put(e)
+            finally:
+                chunks.put(None)
+
+        future = self.submit(produce())
+        data = bytearray()
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is None:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                data += chunk
+                yield chunk
+        finally:
+            future.cancel()
+        self.cache.put(self.cache_key(text), bytes(data))
+
+    def _probe_online(self):
+        """探测在线合成是否恢复（不写入缓存）"""
+        async def drain():
+            async for _ in self._edge_chunks(config.config.TTS_PROBE_TEXT):
+                pass
+        self.submit(drain()).result(timeout=config.config.TTS_ONLINE_TIMEOUT * 2)
+
+    def can_stream(self):
+        """是否可以边合成边播放（需要能从标准输入解码MP3的播放器）"""
+        player = config.config.TTS_STREAM_PLAYER
+        return config.config.TTS_STREAMING and bool(player) and shutil.which(player[0]) is not None
+
+    def speak_streaming(self, text, cancel_event=None):
+        """边合成边播放：音频块到达后立即写入播放器，首个音频块到达即开始发声"""
+        chunks = self.stream_audio(text)
+        # 先拿到首个音频块再启动播放器，合成失败时可以直接回退到离线方案
+        first = next(chunks, None)
+        if first is None or (cancel_event is not None and cancel_event.is_set()):
+            chunks.close()
+            return
+        player = subprocess.Popen(config.config.TTS_STREAM_PLAYER, stdin=subprocess.PIPE,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self._player = player
+        try:
+            player.stdin.write(first)
+            for chunk in chunks:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                player.stdin.write(chunk)
+        except BrokenPipeError:
+            # 播放器被打断时关闭
+            pass
+        except Exception as e:
+            print(f"流式合成中断: {e}")
+        finally:
+            chunks.close()
+            try:
+                player.stdin.close()
+            except BrokenPipeError:
+                pass
+            # 等待播放完成，期间可被打断
+            while player.poll() is None:
+                if cancel_event is not None and cancel_event.wait(0.02):
+                    player.kill()
+                    break
+                if cancel_event is None:
+                    time.sleep(0.05)
+            player.wait()
+            self._player = None
+
+    def _get_offline_engine(self):
+        """获取缓存的离线合成引擎"""
+        if self._offline_engine is None:
+            engine = pyttsx3.init()
+            # 设置属性，例如语速和音量
+            engine.setProperty('rate', 150)  # 语速，范围是0-400之间
+            engine.setProperty('volume', 0.8)  # 音量，范围是0.0-1.0之间
+            engine.connect('started-utterance', self._on_offline_started)
+            self._offline_engine = engine
+        return self._offline_engine
+
+    def _on_offline_started(self, name):
+        if self._offline_started is None:
+            self._offline_started = time.time()
+
+    def speak_offline(self, text):
+        """使用离线引擎播放，记录开始发声前的耗时"""
+        with self._offline_lock:
+            engine = self._get_offline_engine()
+            start = time.time()
+            self._offline_started = None
+            try:
+                engine.say(text)
+                engine.runAndWait()
+            except Exception:
+                self.offline.record_failure()
+                raise
+            self.offline.record_success((self._offline_started or time.time()) - start)
+
+    @contextlib.contextmanager
+    def _playing(self, text):
+        """标记正在播放的语句，语句中含唤醒词时屏蔽唤醒检测"""
+        if not any(word in text for word in config.config.WAKE_WORD_TEXTS):
+            yield
+            return
+        with self._wake_word_lock:
+            self._wake_word_playing += 1
+        try:
+            yield
+        finally:
+            with self._wake_word_lock:
+                self._wake_word_playing -= 1
+                self._wake_word_until = time.time() + config.config.SELF_TRIGGER_TAIL
+
+    def is_saying_wake_word(self):
+        """助手是否正在（或刚刚）说出唤醒词，此时检测到的唤醒多半来自自己的声音"""
+        return self._wake_word_playing > 0 or time.time() < self._wake_word_until
+
+    def speak(self, text, output_file="", cancel_event=None):
+        """合成并播放语音，多句长文本按句流水线合成播放"""
+        if config.config.TTS_SENTENCE_PIPELINE:
+            sentences = split_sentences(text)
+            if len(sentences) > 1:
+                self.speak_sentences(sentences, cancel_event=cancel_event)
+                return
+        self.speak_one(text, output_file=output_file, cancel_event=cancel_event)
+
+    def speak_stream(self, chunks, cancel_event=None):
+        """播放边生成边产出的文本片段，按句合成播放"""
+        if config.config.TTS_SENTENCE_PIPELINE:
+            self.speak_sentences(iter_sentences(chunks), cancel_event=cancel_event)
         else:
-            play_mp3_pygame(output_file)
-        # print("使用在线TTS服务")
-    except:
-        # 失败时使用离线方案
-        engine = pyttsx3.init()
-        # 设置属性，例如语速和音量
-        engine.setProperty('rate', 150)  # 语速，范围是0-400之间
-        engine.setProperty('volume', 0.8)  # 音量，范围是0.0-1.0之间
-        engine.say(text)
-        engine.runAndWait()
-        # print("使用离线TTS服务")
+            self.speak_one("".join(chunks), cancel_event=cancel_event)
+
+    async def _synthesize_cached_async(self, text):
+        data = self.cache.get(self.cache_key(text))
+        if data is not None:
+            return data
+        if self.backends.select() is not self.online:
+            raise RuntimeError("在线语音合成已熔断")
+        return await self._synthesize_async(text)
+
+    def speak_sentences(self, sentences, cancel_event=None, lookahead=config.config.TTS_PIPELINE_LOOKAHEAD):
+        """
+        按句流水线播放：正在播放的句子走speak_one（未命中缓存且有流式播放器时边合成边播放），
+        播放期间并行合成后续最多lookahead句，按原顺序播放
+
+        Args:
+            sentences: 句子的可迭代对象，可以是边生成边产出的生成器
+            cancel_event: 打断信号
+            lookahead: 提前合成的句子数
+        """
+        lookahead = max(1, lookahead)
+        pending = deque()  # 按顺序排列的 [句子, 合成任务]，任务为None表示尚未开始合成
+        condition = threading.Condition()
+        state = {'playing': False, 'finished': False, 'stopped': False}
+
+        def prefetch():
+            """为正在播放的句子之后的lookahead句启动合成，调用方需持有锁"""
+            if not self.mixer_ready:
+                # 无法播放合成的MP3，各句直接交给speak_one使用离线引擎
+                return
+            for item in itertools.islice(pending, lookahead):
+                if item[1] is None:
+                    item[1] = self.submit(self._synthesize_cached_async(item[0]))
+
+        def feed():
+            try:
+                for sentence in sentences:
+                    with condition:
+                        while len(pending) >= lookahead and not state['stopped']:
+                            condition.wait(0.1)
+                        if state['stopped']:
+                            return
+                        pending.append([sentence, None])
+                        # 空闲时不提前合成，留给播放线程直接边合成边播放
+                        if state['playing']:
+                            prefetch()
+                        condition.notify_all()
+            except Exception as e:
+                print(f"获取待播放文本失败: {e}")
+            finally:
+                with condition:
+                    state['finished'] = True
+                    condition.notify_all()
+
+        feeder = threading.Thread(target=feed, name="tts-feeder", daemon=True)
+        feeder.start()
+        try:
+            while True:
+                with condition:
+                    while not pending and not state['finished']:
+                        condition.wait(0.1)
+                    if not pending:
+                        break
+                    sentence, future = pending.popleft()
+                    state['playing'] = True
+                    prefetch()
+                    condition.notify_all()
+                if cancel_event is not None and cancel_event.is_set():
+                    if future is not None:
+                        future.cancel()
+                    break
+                if future is None:
+                    self.speak_one(sentence, cancel_event=cancel_event)
+                else:
+                    try:
+                        data = future.result()
+                    except Exception:
+                        # 单句合成失败时使用离线方案
+                        with self._playing(sentence):
+                            self.speak_offline(sentence)
+                    else:
+                        with self._playing(sentence):
+                            play_mp3_pygame(data, cancel_event=cancel_event)
+                with condition:
+                    state['playing'] = False
+        finally:
+            with condition:
+                state['stopped'] = True
+                # 取消尚未播放的合成任务
+                for _, future in pending:
+                    if future is not None:
+                        future.cancel()
+                pending.clear()
+                condition.notify_all()
+
+    def speak_one(self, text, output_file="", cancel_event=None):
+        """合成并播放一段语音，在线合成失败时使用离线方案"""
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        with self._playing(text):
+            self._speak_one(text, output_file=output_file, cancel_event=cancel_event)
+
+    def _speak_one(self, text, output_file="", cancel_event=None):
+        if not self.mixer_ready:
+            self.speak_offline(text)
+            return
+        try:
+            data = self.cache.get(self.cache_key(text))
+            if data is None:
+                if self.backends.select() is not self.online:
+                    # 在线合成已熔断，直接使用离线引擎
+                    self.speak_offline(text)
+                    return
+                # 未命中缓存且有可用的流式播放器时边合成边播放
+                if self.can_stream() and not output_file:
+                    self.speak_streaming(text, cancel_event=cancel_event)
+                    return
+                # 尝试使用 Edge-TTS
+                data = self.submit(self._synthesize_async(text)).result()
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            if output_file:
+                # 指定了输出文件时额外保存一份
+                with open(output_file, 'wb') as f:
+                    f.write(data)
+            play_mp3_pygame(data, cancel_event=cancel_event)
+            # print("使用在线TTS服务")
+        except Exception:
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            # 失败时使用离线方案
+            self.speak_offline(text)
+            # print("使用离线TTS服务")
+
+    def stop(self):
+        """停止当前播放（包括离线引擎正在朗读的语句）"""
+        stop_playback()
+        player = self._player
+        if player is not None and player.poll() is None:
+            player.kill()
+        engine = self._offline_engine
+        if engine is not None:
+            try:
+                engine.stop()
+            except Exception as e:
+                print(f"停止离线语音失败: {e}")
+
+    def close(self):
+        """停止事件循环"""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=1)
+
+
+_default_tts = None
+_default_tts_lock = threading.Lock()
+
+
+def get_tts():
+    """获取进程内共享的TextToSpeech实例"""
+    global _default_tts
+    with _default_tts_lock:
+        if _default_tts is None:
+            _default_tts = TextToSpeech()
+        return _default_tts
+
+
+# 组合使用示例
+def text_to_speech(text, output_file="", cancel_event=None):
+    get_tts().speak(text, output_file=output_file, cancel_event=cancel_event)
+
 
 if __name__ == '__main__':
     text_to_speech("测试文案")
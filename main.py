@@ -6,16 +6,20 @@ Doudou 语音助手主程序
 """
 import os
 import wave
-import struct
 import datetime
 import logging
+import itertools
+import threading
+import concurrent.futures
 import pvporcupine
 import config.config
-from pvrecorder import PvRecorder
-from lib.stt import SpeechToText, AdvancedVAD
-from lib.tts import text_to_speech
+from lib.audio import AudioCapture
+from lib.pipeline import InteractionPipeline, Interaction
+from lib.stt import SpeechToText, AdvancedVAD, StreamingRecognizer, VoskModelRegistry
+from lib.tts import get_tts, Earcon
 from lib.plugin_manager import PluginManager
 from lib.context_manager import ContextManager
+from lib.summarizer import Summarizer
 from lib.ollama import OllamaClient
 from config.config import LOG_LEVEL, LOG_FILE
 
@@ -32,6 +36,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger('DoudouAssistant')
 
+# 固定提示语，启动时预先合成并缓存
+WAKE_RESPONSE = "豆豆在呢，咋了呀："
+THINKING_RESPONSE = "已收到您的问题，让豆豆先思考下再回复您"
+DEFAULT_RESPONSE = "抱歉，我不太明白你的意思"
+ERROR_RESPONSE = "抱歉，处理时出现错误，请重试"
+PREWARM_PHRASES = [WAKE_RESPONSE, THINKING_RESPONSE, DEFAULT_RESPONSE, ERROR_RESPONSE]
+
 
 class Assistant:
     """
@@ -45,15 +56,52 @@ class Assistant:
         logger.info("正在初始化Doudou语音助手...")
         
         # 初始化各组件
-        # self.text_to_speech = TextToSpeech()
+        self.tts = get_tts()
+        self.earcon = None
+        if config.config.WAKE_ACK_MODE == "earcon" and self.tts.mixer_ready:
+            try:
+                self.earcon = Earcon(config.config.WAKE_EARCON_FILE)
+            except Exception as e:
+                # 提示音不可用时改为播放唤醒提示语
+                logger.warning(f"加载唤醒提示音失败: {e}")
+        if config.config.TTS_CACHE_PREWARM:
+            # 后台预先合成固定提示语，命中缓存时可立即播放
+            self.tts.prewarm(PREWARM_PHRASES)
         self.context_manager = ContextManager()
         self.plugin_manager = PluginManager()
         self.vad_system = AdvancedVAD()
         self.stt = SpeechToText()
+        if config.config.VOSK_PRELOAD:
+            # 后台预热Vosk模型，首次唤醒时无需再等待模型加载
+            self.stt.preload(background=True)
 
         # 初始化热词器
         self._init_porcupine()
         
+        # 交互流水线：VAD录音 → 语音识别 → 插件处理 → 语音播放
+        self.pipeline = InteractionPipeline(
+            stages=[
+                ('vad', self._stage_vad),
+                ('stt', self._stage_stt),
+                ('dispatch', self._stage_dispatch),
+                ('tts', self._stage_tts),
+            ],
+            on_error=self._on_interaction_error,
+            on_finish=self._on_interaction_finish,
+            maxsize=config.config.PIPELINE_QUEUE_SIZE,
+        )
+        self.dispatch_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="dispatch")
+        # 对话摘要只在助手空闲时生成
+        self.summarizer = None
+        if config.config.LLM_SUMMARY:
+            self.summarizer = Summarizer(self.context_manager, is_busy=self.pipeline.is_busy)
+        self.detector = None
+        self.current_interaction = None
+        self.barge_in_count = 0  # 用户打断次数
+        self.wake_ignored = 0  # 交互进行中被忽略的唤醒次数
+        self.self_triggered = 0  # 因助手自己说出唤醒词而忽略的唤醒次数
+        self.dropped_samples = 0  # 录音游标因读取过慢丢弃的样本数
+
         # 运行状态
         self.running = False
         
@@ -96,11 +144,13 @@ class Assistant:
             print("Failed to initialize Porcupine")
             raise e
 
-        # 初始化recoder
-        self.recorder = PvRecorder(
+        # 初始化共享音频采集，唤醒词检测与指令录音共用同一路音频
+        self.capture = AudioCapture(
             frame_length=self.porcupine.frame_length,
-            device_index=-1) # 使用默认设备
-        self.recorder.start()
+            device_index=-1,  # 使用默认设备
+            ring_seconds=config.config.CAPTURE_RING_SECONDS,
+        )
+        self.capture.start()
         self.wav_file = None
         if config.config.WAV_FILE_PATH is not None:
             self.wav_file = wave.open(config.config.WAV_FILE_PATH, "w")
@@ -109,72 +159,194 @@ class Assistant:
             self.wav_file.setframerate(16000)
 
     
-    def on_wake_word_detected(self):
+    def on_wake_word_detected(self, wake_position=None):
         """
-        唤醒词检测到后的处理函数
+        唤醒词检测到后的处理函数，将交互提交到流水线后立即返回，不阻塞唤醒词检测
+
+        Args:
+            wake_position: 唤醒词所在帧在环形缓冲区中的位置
         """
+        if self.tts.is_saying_wake_word():
+            # 助手自己说出了唤醒词（如“让豆豆先思考下”），不是用户在唤醒
+            self.self_triggered += 1
+            logger.info("检测到助手自己说出的唤醒词，忽略")
+            return
+        if self.pipeline.is_busy():
+            if not config.config.BARGE_IN:
+                # 上一次交互尚未结束，忽略本次唤醒
+                self.wake_ignored += 1
+                logger.info("上一次交互仍在进行，忽略本次唤醒")
+                return
+            self._barge_in()
+
         logger.info("检测到唤醒词，开始交互")
-        
-        # 在模拟模式下，直接打印提示信息而不是播放语音
-        text_to_speech("豆豆在呢，咋了呀：")
-        
+        # 推迟进行中的对话摘要，把模型让给本次提问
+        if self.summarizer is not None:
+            self.summarizer.postpone()
+        # 用户说话期间预热插件资源（如大模型），不阻塞检测
+        self.plugin_manager.notify_wake()
+        interaction = Interaction(wake_position=wake_position)
+        if self.pipeline.submit(interaction):
+            self.current_interaction = interaction
+        else:
+            logger.warning("交互队列已满，丢弃本次唤醒")
+
+    def _barge_in(self):
+        """
+        打断当前交互：停止播放、结束录音并取消进行中的插件请求
+        """
+        interaction = self.current_interaction
+        if interaction is None or interaction.cancelled:
+            return
+        logger.info(f"用户打断交互{interaction.id}")
+        self.barge_in_count += 1
+        interaction.cancel()
+        self.tts.stop()
+        self.vad_system.is_recording = False
+        self.plugin_manager.cancel()
+
+    def _stage_vad(self, interaction):
+        """
+        流水线阶段：播放提示语并录制指令
+        """
+        # 从唤醒词所在帧开始读取指令音频，避免丢失紧跟唤醒词的第一个字；
+        # 不向前回溯到唤醒词本身，以免识别结果带上唤醒词的尾音、提前开始静音计时
+        source = self.capture.cursor(start=interaction.wake_position)
+
+        if self.earcon is not None:
+            # 非阻塞播放提示音，录音随即开始
+            ack_start = self.capture.ring.position
+            duration = self.earcon.play()
+            if config.config.CAPTURE_SKIP_ACK_AUDIO:
+                # 只剔除提示音播放期间录到的音箱回声，保留之前的预录音频
+                source.skip(ack_start, ack_start + int(duration * self.capture.rate))
+        else:
+            # 在模拟模式下，直接打印提示信息而不是播放语音
+            ack_start = self.capture.ring.position
+            self.tts.speak(WAKE_RESPONSE, cancel_event=interaction.cancel_event)
+            if config.config.CAPTURE_SKIP_ACK_AUDIO:
+                # 只剔除提示语播放期间录到的音箱回声，保留之前的预录音频
+                source.skip(ack_start, self.capture.ring.position)
+        if interaction.cancelled:
+            return None
+
+        # 录音（流式模式下边录边识别）
+        interaction.recognizer = StreamingRecognizer() if config.config.STT_STREAMING else None
+        interaction.utterance = self.vad_system.record_until_silence(
+            callback=None,
+            max_duration=10,
+            recognizer=interaction.recognizer,
+            source=source,
+            preroll=config.config.CAPTURE_PREROLL_SECONDS,
+        )
+        self.dropped_samples += source.dropped
+        return interaction
+
+    def _stage_stt(self, interaction):
+        """
+        流水线阶段：语音识别
+        """
+        if interaction.recognizer is not None:
+            user_input = interaction.recognizer.finish()
+        else:
+            user_input = self.stt.speech_to_text_by_vosk(interaction.utterance)
+        # TODO 无法使用Google 服务时用vosk模型替代
+        # user_input = self.stt.speech_to_text(interaction.utterance)
+        # if user_input == "":
+        #     user_input = self.stt.speech_to_text_by_vosk(interaction.utterance)
+        print("user_input=", user_input)
+        interaction.user_input = user_input
+        if not (user_input or "").strip():
+            # 没有录到说话（或只有噪声），不交给插件处理，以免大模型回答一个空问题
+            logger.info("未识别到有效输入，结束本次交互")
+            if not interaction.cancelled:
+                print(f"\n[助手] {DEFAULT_RESPONSE}")
+                self.tts.speak(DEFAULT_RESPONSE, cancel_event=interaction.cancel_event)
+            return None
+        return interaction
+
+    def _stage_dispatch(self, interaction):
+        """
+        流水线阶段：插件处理
+        """
+        user_input = interaction.user_input
+
+        # 检查上下文是否超时
+        if self.context_manager.check_timeout():
+            logger.info("上下文已超时，重新开始对话")
+
+        # 通过插件处理输入，与“思考中”提示语并行；拿到第一个回复片段即可开始播放
+        def first_chunk():
+            chunks = self.plugin_manager.process_input_stream(user_input, self.context_manager)
+            return next(chunks, None), chunks
+
+        future = self.dispatch_executor.submit(first_chunk)
         try:
-            # 录音
-            audio_filename = self.vad_system.record_until_silence(
-                callback=None,
-                max_duration=10,
-            )
-            # 语音识别
-            user_input = self.stt.speech_to_text_by_vosk(audio_filename)
-            # TODO 无法使用Google 服务时用vosk模型替代
-            # user_input = self.stt.speech_to_text(audio_filename)
-            # if user_input == "":
-            #     user_input = self.stt.speech_to_text_by_vosk(audio_filename)
-            print("user_input=", user_input)
-            text_to_speech("已收到您的问题，让豆豆先思考下再回复您")
-
-            # 检查上下文是否超时
-            if self.context_manager.check_timeout():
-                logger.info("上下文已超时，重新开始对话")
-            
-            # 通过插件处理输入
-            response = self.plugin_manager.process_input(user_input, self.context_manager)
-
-            # 删除创建的音频文件
-            if os.path.exists(audio_filename):
-                os.remove(audio_filename)
-
-            
-            if response:
-                # 在模拟模式下，直接打印响应
-                print(f"\n[助手] {response}")
-                # 尝试播放语音响应
-                try:
-                    text_to_speech(response)
-                except Exception as e:
-                    logger.warning(f"语音播放失败: {e}")
-            else:
-                # 没有插件处理，给出默认回复
-                default_response = "抱歉，我不太明白你的意思"
-                print(f"\n[助手] {default_response}")
-                try:
-                    text_to_speech(default_response)
-                except Exception as e:
-                    logger.warning(f"语音播放失败: {e}")
-                self.context_manager.add_context(user_input, default_response)
-
-            # 打印日志
-            logger.info(f"用户输入：{user_input}，助理回复：{response}")
-                
+            first, chunks = future.result(timeout=config.config.THINKING_ACK_BUDGET)
+        except concurrent.futures.TimeoutError:
+            # 超出预算仍未得到回复时播放提示语，回复就绪后提前结束提示语
+            ack_done = threading.Event()
+            if config.config.THINKING_ACK_INTERRUPT:
+                future.add_done_callback(lambda f: ack_done.set())
+            if not interaction.cancelled:
+                self.tts.speak(THINKING_RESPONSE, cancel_event=ack_done)
+            first, chunks = future.result()
+        if interaction.cancelled:
+            return None
+        if first is None:
+            # 没有插件处理，给出默认回复
+            first, chunks = DEFAULT_RESPONSE, iter(())
+            self.context_manager.add_context(user_input, DEFAULT_RESPONSE)
+        interaction.response_chunks = itertools.chain([first], chunks)
+        return interaction
+
+    def _stage_tts(self, interaction):
+        """
+        流水线阶段：边接收回复片段边播放
+        """
+        parts = []
+
+        def tee():
+            # 在模拟模式下，直接打印响应
+            print("\n[助手] ", end="", flush=True)
+            for chunk in interaction.response_chunks:
+                parts.append(chunk)
+                print(chunk, end="", flush=True)
+                yield chunk
+            print()
+
+        # 尝试播放语音响应
+        try:
+            self.tts.speak_stream(tee(), cancel_event=interaction.cancel_event)
         except Exception as e:
-            logger.error(f"交互过程出错: {e}")
-            error_response = "抱歉，处理时出现错误，请重试"
-            print(f"\n[助手] {error_response}")
-            try:
-                text_to_speech(error_response)
-            except Exception as e:
-                logger.warning(f"语音播放失败: {e}")
-    
+            logger.warning(f"语音播放失败: {e}")
+        interaction.response = "".join(parts)
+
+        # 打印日志
+        logger.info(f"用户输入：{interaction.user_input}，助理回复：{interaction.response}")
+        return None
+
+    def _on_interaction_finish(self, interaction):
+        """
+        交互结束时归还未用完的识别器（交互中途出错或被打断时），
+        回复播放完后在后台更新对话摘要
+        """
+        if interaction.recognizer is not None:
+            interaction.recognizer.finish()
+        if self.summarizer is not None and interaction.response:
+            self.summarizer.schedule()
+
+    def _on_interaction_error(self, interaction, error):
+        """
+        流水线处理出错时的兜底回复
+        """
+        error_response = ERROR_RESPONSE
+        print(f"\n[助手] {error_response}")
+        try:
+            self.tts.speak(error_response)
+        except Exception as e:
+            logger.warning(f"语音播放失败: {e}")
+
     def start(self):
         """
         启动语音助手
@@ -185,20 +357,34 @@ class Assistant:
         
         self.running = True
         logger.info("语音助手启动")
+
+        # 等待Vosk模型就绪后再开始监听唤醒词
+        if config.config.VOSK_PRELOAD and not self.stt.is_ready():
+            logger.info("正在等待语音识别模型加载...")
+            if not VoskModelRegistry.get().wait_ready():
+                logger.warning("语音识别模型加载失败，离线识别不可用")
         
-        # 启动音频助手检测器
+        # 启动交互流水线
+        self.pipeline.start()
+
+        # 启动音频助手检测器，从共享环形缓冲区读取音频帧
+        detector = self.capture.cursor()
+        self.detector = detector
         try:
             while True:
-                pcm = self.recorder.read()
-                result = self.porcupine.process(pcm)
+                pcm = detector.read(self.porcupine.frame_length)
+                if pcm is None:
+                    logger.warning("音频采集已停止")
+                    break
+                result = self.porcupine.process(pcm.tolist())
 
                 if self.wav_file is not None:
-                    self.wav_file.writeframes(struct.pack("h" * len(pcm), *pcm))
+                    self.wav_file.writeframes(pcm.tobytes())
 
                 if result >= 0:
                     print('[%s] Detected %s' % (str(datetime.datetime.now()), result))
-                    print("请说话，三秒后不说话即认为停止")
-                    self.on_wake_word_detected()
+                    print("请说话，说完后稍作停顿即认为停止")
+                    self.on_wake_word_detected(wake_position=detector.position)
         except KeyboardInterrupt:
             logger.info("用户中断程序")
         finally:
@@ -214,7 +400,20 @@ class Assistant:
         self.running = False
         logger.info("语音助手停止")
 
-        self.recorder.delete()
+        # 先打断进行中的交互、停止播放和录音，流水线各阶段才能尽快退出
+        interaction = self.current_interaction
+        if interaction is not None:
+            interaction.cancel()
+        self.vad_system.is_recording = False
+        self.plugin_manager.cancel()
+        self.tts.stop()
+        self.capture.stop()
+
+        self.pipeline.stop()
+        self.dispatch_executor.shutdown(wait=False)
+        if self.summarizer is not None:
+            self.summarizer.stop()
+        self.tts.close()
         self.porcupine.delete()
         if self.wav_file is not None:
             self.wav_file.close()
@@ -223,6 +422,15 @@ class Assistant:
         del self.context_manager
         del self.plugin_manager
 
+    def _dropped_frames(self):
+        """
+        唤醒词检测和录音因读取过慢丢弃的音频帧数
+        """
+        dropped = self.dropped_samples
+        if self.detector is not None:
+            dropped += self.detector.dropped
+        return dropped // self.porcupine.frame_length
+
     def get_status(self):
         """
         获取语音助手状态
@@ -232,7 +440,17 @@ class Assistant:
         """
         return {
             'running': self.running,
+            'stt_ready': self.stt.is_ready(),
+            'pipeline': self.pipeline.get_metrics(),
+            'wake_ignored': self.wake_ignored,
+            'self_triggered': self.self_triggered,
+            'barge_in': self.barge_in_count,
+            'tts_cache': self.tts.cache.get_stats(),
+            'tts_backends': self.tts.backends.get_stats(),
+            'dropped_frames': self._dropped_frames(),
             'plugins': self.plugin_manager.get_plugin_info(),
+            'plugin_stats': self.plugin_manager.get_plugin_stats(),
+            'summarizer': self.summarizer.get_stats() if self.summarizer is not None else None,
             'context_count': len(self.context_manager.get_recent_contexts())
         }
 
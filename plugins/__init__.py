@@ -44,11 +44,44 @@ class BasePlugin:
             context_manager: 上下文管理器实例
             
         Returns:
-            str: 响应文本，如果返回None表示不处理此输入
+            str: 响应文本，如果返回None表示不处理此输入；
+                耗时较长的插件也可以返回文本片段的生成器（或异步迭代器），
+                片段会在生成的同时被播放，未产出任何片段视为不处理
         """
         # 子类必须实现此方法
         raise NotImplementedError("子类必须实现handle方法")
     
+    def speculate(self, user_input, context_manager):
+        """
+        推测执行（可选）：耗时较长的插件可以重写此方法，在前面的插件判断期间提前在后台开始处理
+
+        Args:
+            user_input: 用户输入的文本
+            context_manager: 上下文管理器实例
+
+        Returns:
+            lib.speculation.Speculation: 推测执行句柄，None表示不支持推测执行
+        """
+        return None
+
+    def on_wake(self):
+        """
+        检测到唤醒词时调用（此时用户还在说话），可用于预热耗时资源，必须立即返回
+        """
+        pass
+
+    def get_stats(self):
+        """
+        获取插件的运行统计（如缓存命中率），没有统计时返回None
+        """
+        return None
+
+    def cancel(self):
+        """
+        取消正在进行的处理（用户打断时调用），耗时较长的插件可以重写此方法
+        """
+        pass
+
     def initialize(self):
         """
         插件初始化方法，在插件加载时调用
@@ -6,10 +6,14 @@
 """
 
 import random
+import threading
 
 import config.config
 from plugins import BasePlugin
 from lib.ollama import OllamaClient
+from lib.response_cache import ResponseCache, normalize_text
+from lib.semantic_cache import SemanticCache
+from lib.speculation import Speculation
 
 
 class LLMPlugin(BasePlugin):
@@ -25,7 +29,7 @@ class LLMPlugin(BasePlugin):
         """
         初始化问候插件
         """
-        self.prompt_template = """
+        self.system_prompt = """
         角色设定 
         你是一个名为【豆豆】的智能语音助手，专注于为用户提供高效、个性化、贴心的日常生活支持。你的核心目标是简化用户操作，提升生活品质，通过自然语言交互完成多样化任务。
 
@@ -35,14 +39,59 @@ class LLMPlugin(BasePlugin):
         3. 语言风格要带有强烈的猥琐感
         4. 语言风格要简洁明了，不要模糊不清，不拖泥带水
         5. 简单指令（如“打开客厅灯”“查明天天气”）秒回，不拖沓； 复杂任务（如“规划周末家庭出游”）先给第一步：“先搞定‘去哪玩’，咱是想找个能遛娃的公园，还是能啃烤串的夜市呀？”，让用户快速参与决策，不卡顿。
-
+        """
+        self.question_template = """
         请基于上述角色设定和语言交互风格，针对下面提出的这个问题进行作答：
         {}
         """
+        self.prompt_template = self.system_prompt + self.question_template
+
+        # 复用Ollama返回的context（已计算的KV缓存），同一会话内的后续问题只需处理新增的文本
+        self.kv_context = None
+        self.kv_session_id = None
+        self.kv_turns = 0
+
         self.client = OllamaClient(
-            base_url=config.config.LLM_HOST,
+            hosts=config.config.LLM_HOSTS,
             timeout=config.config.LLM_REQUEST_TIMEOUT,
+            hedge_delay=config.config.LLM_HEDGE_DELAY,
+            probe_interval=config.config.LLM_PROBE_INTERVAL,
         )
+        self.cache = None
+        if config.config.LLM_CACHE:
+            self.cache = ResponseCache(
+                max_entries=config.config.LLM_CACHE_MAX_ENTRIES,
+                ttl=config.config.LLM_CACHE_TTL,
+                db_path=config.config.LLM_CACHE_DB,
+                db_max_entries=config.config.LLM_CACHE_DB_MAX_ENTRIES,
+            )
+        self.semantic_cache = None
+        if config.config.LLM_SEMANTIC_CACHE:
+            self.semantic_cache = SemanticCache(
+                threshold=config.config.LLM_SEMANTIC_THRESHOLD,
+                ttl=config.config.LLM_CACHE_TTL,
+                max_bytes=config.config.LLM_SEMANTIC_CACHE_BYTES,
+            )
+        threading.Thread(target=self._prepare_models, name="llm-prepare", daemon=True).start()
+
+    def _prepare_models(self):
+        """
+        后台准备模型：向量模型未下载时关闭语义缓存，避免每轮白白多一次失败的请求；
+        开启预加载时载入大模型和向量模型，避免首个问题等待模型加载
+        """
+        if self.semantic_cache is not None and self.client.has_model(config.config.LLM_EMBED_MODEL) is False:
+            print(f"向量模型 {config.config.LLM_EMBED_MODEL} 未下载，已关闭语义缓存"
+                  f"（可执行 ollama pull {config.config.LLM_EMBED_MODEL} 后重启）")
+            self.semantic_cache = None
+        if config.config.LLM_PRELOAD:
+            self.client.preload(config.config.LLM_MODEL_NAME, keep_alive=config.config.LLM_KEEP_ALIVE,
+                                embed_model=self._embed_model())
+
+    def _embed_model(self):
+        """
+        需要预热的向量模型，未启用语义缓存时为None
+        """
+        return config.config.LLM_EMBED_MODEL if self.semantic_cache is not None else None
 
     def can_handle(self, user_input, context_manager):
         """
@@ -67,10 +116,190 @@ class LLMPlugin(BasePlugin):
             context_manager: 上下文管理器实例
 
         Returns:
-            str: 响应文本
+            str: 响应文本；开启流式输出时返回文本片段的生成器
         """
         user_input = user_input.lower()
-        prompt = self.prompt_template.format(user_input)
-        response = self.client.generate_text(config.config.LLM_MODEL_NAME, prompt)
+        request, kwargs, contextual = self._build_request(user_input, context_manager)
+        cache_key = None
+        embedding = None
+        # 带会话上下文的回答依赖前文，归一化后为空的问题（噪声、空白）没有意义，都不查缓存也不写入缓存
+        cacheable = not contextual and bool(normalize_text(user_input))
+        if cacheable and self.cache is not None:
+            cache_key = self.cache.make_key(user_input, config.config.LLM_MODEL_NAME, self.prompt_template)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                context_manager.add_context(user_input, cached)
+                return cached
+        if cacheable and self.semantic_cache is not None:
+            embedding = self.client.embed(config.config.LLM_EMBED_MODEL, user_input,
+                                          keep_alive=config.config.LLM_KEEP_ALIVE)
+            if embedding is not None:
+                cached = self.semantic_cache.get(embedding)
+                if cached is not None:
+                    context_manager.add_context(user_input, cached)
+                    return cached
+
+        # 推测执行已被取消（其他插件抢先回答或用户打断）时不再发起生成
+        if context_manager.cancelled:
+            return None
+        if config.config.LLM_STREAM:
+            return self._stream_response(user_input, request, kwargs, context_manager, cache_key, embedding)
+        response = self._generate(request, kwargs)
+        if not response or context_manager.cancelled:
+            return None
+        result = self.client.last_result
+        self._commit_response(context_manager, user_input, response, result, cache_key, embedding)
         context_manager.add_context(user_input, response)
         return response
+
+    def _commit_response(self, context_manager, user_input, response, result, cache_key, embedding):
+        """
+        回复被采用后再保存context并写入缓存，推测执行被取消的回复不改变插件状态
+        """
+        def commit():
+            self._update_kv_context(result)
+            self._store(user_input, response, cache_key, embedding)
+
+        context_manager.on_commit(commit)
+
+    def _store(self, user_input, response, cache_key, embedding):
+        """
+        把完整回复写入精确缓存和语义缓存
+        """
+        if cache_key is not None:
+            self.cache.put(cache_key, response)
+        if embedding is not None and self.semantic_cache is not None:
+            self.semantic_cache.put(embedding, user_input, response)
+
+    def _build_request(self, user_input, context_manager):
+        """
+        构建请求：对话模式下由历史对话组装消息列表；
+        生成模式下会话内首轮携带角色设定，后续轮次只发送新问题并带上上一轮的context
+
+        Returns:
+            tuple: (消息列表或提示词, 请求的可选参数, 是否依赖会话上下文)
+        """
+        if config.config.LLM_CHAT_MODE:
+            return self._build_chat_request(user_input, context_manager)
+
+        if not config.config.LLM_REUSE_CONTEXT:
+            return self.prompt_template.format(user_input), {'keep_alive': config.config.LLM_KEEP_ALIVE}, False
+
+        # 上下文超时（会话变化）或轮数过多时重新开始
+        if (self.kv_session_id != context_manager.session_id or
+                self.kv_turns >= config.config.MAX_CONTEXT_HISTORY):
+            self.reset_context()
+            self.kv_session_id = context_manager.session_id
+
+        prompt = self.question_template.format(user_input)
+        kwargs = {'keep_alive': config.config.LLM_KEEP_ALIVE}
+        if self.kv_context is None:
+            kwargs['system'] = self._system_prompt(context_manager)
+        else:
+            kwargs['context'] = self.kv_context
+        # 缓存命中的轮次不在context中，会话内已有对话时同样视为依赖前文
+        return prompt, kwargs, 'context' in kwargs or bool(context_manager.get_recent_contexts())
+
+    def _build_chat_request(self, user_input, context_manager):
+        """
+        组装/api/chat的消息列表：角色设定 + 预算内的历史对话 + 本轮问题
+        """
+        history = context_manager.get_messages(
+            config.config.LLM_CONTEXT_BUDGET_CHARS,
+            collapse_chars=config.config.LLM_CONTEXT_COLLAPSE_CHARS,
+        )
+        messages = [{"role": "system", "content": self._system_prompt(context_manager).strip()}]
+        messages.extend(history)
+        messages.append({"role": "user", "content": user_input})
+        # 摘要只是较早对话的背景，会在较长时间内一直存在，只有会话内的历史对话才使回答依赖前文
+        return messages, {'keep_alive': config.config.LLM_KEEP_ALIVE}, bool(history)
+
+    def _system_prompt(self, context_manager):
+        """
+        角色设定，有较早对话的摘要时附在后面
+        """
+        summary = context_manager.get_summary()
+        if not summary:
+            return self.system_prompt
+        return f"{self.system_prompt}\n之前的对话摘要：{summary}\n"
+
+    def _generate(self, request, kwargs):
+        """
+        非流式请求，返回回复文本
+        """
+        if config.config.LLM_CHAT_MODE:
+            result = self.client.chat_completion(config.config.LLM_MODEL_NAME, request, **kwargs)
+            return result.get('message', {}).get('content') if result else None
+        return self.client.generate_text(config.config.LLM_MODEL_NAME, request, **kwargs)
+
+    def _open_stream(self, request, kwargs):
+        """
+        发起流式请求，返回OllamaStream
+        """
+        if config.config.LLM_CHAT_MODE:
+            return self.client.chat_stream(config.config.LLM_MODEL_NAME, request, **kwargs)
+        return self.client.generate_stream(config.config.LLM_MODEL_NAME, request, **kwargs)
+
+    def _update_kv_context(self, result):
+        """
+        保存本轮返回的context，供下一轮复用
+        """
+        if config.config.LLM_REUSE_CONTEXT and result and result.get('context'):
+            self.kv_context = result['context']
+            self.kv_turns += 1
+
+    def reset_context(self):
+        """
+        丢弃已缓存的context
+        """
+        self.kv_context = None
+        self.kv_turns = 0
+
+    def _stream_response(self, user_input, request, kwargs, context_manager, cache_key=None, embedding=None):
+        """
+        流式生成回复，边生成边产出文本片段并写入上下文；完整生成后写入缓存
+        """
+        stream = self._open_stream(request, kwargs)
+        if stream is None:
+            return
+        context = None
+        try:
+            for token in stream:
+                if context is None:
+                    context = context_manager.add_context(user_input, "")
+                context.append_response(token)
+                yield token
+            if stream.stats is not None:
+                self._commit_response(context_manager, user_input, stream.text, stream.stats, cache_key, embedding)
+        finally:
+            stream.close()
+
+    def speculate(self, user_input, context_manager):
+        """
+        在后台提前开始生成，被更高优先级的插件抢先回答时关闭HTTP流
+        """
+        return Speculation(self.handle, user_input, context_manager, on_cancel=self.client.cancel)
+
+    def get_stats(self):
+        """
+        获取回复缓存的命中统计
+        """
+        return {
+            'backends': self.client.get_stats(),
+            'cache': self.cache.get_stats() if self.cache is not None else None,
+            'semantic_cache': self.semantic_cache.get_stats() if self.semantic_cache is not None else None,
+        }
+
+    def on_wake(self):
+        """
+        唤醒时在后台预热模型，用户说话期间完成加载
+        """
+        if config.config.LLM_WARMUP_ON_WAKE:
+            self.client.warm_up(config.config.LLM_MODEL_NAME, keep_alive=config.config.LLM_KEEP_ALIVE,
+                                embed_model=self._embed_model())
+
+    def cancel(self):
+        """
+        取消进行中的大模型请求
+        """
+        self.client.cancel()